@@ -0,0 +1,94 @@
+""" latency of kfc.aio.aconvert under concurrent load, compared with converting inline on the event loop
+
+    $ python benchmarks/bench_async.py --clients 32 --requests 50
+"""
+import argparse
+import asyncio
+import os
+import random
+import sys
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+
+import corpus  # noqa: E402
+from kfc import aio, unicode_to_limon  # noqa: E402
+
+
+async def inline(text):
+    return unicode_to_limon(text)
+
+
+async def client(convert, payloads, latencies, rng):
+    due = time.perf_counter()
+    for text in payloads:
+        # latency is counted from when the request was due, time spent waiting for a blocked loop included
+        await asyncio.sleep(max(0.0, due - time.perf_counter()))
+        await convert(text)
+        latencies.append((len(text), time.perf_counter() - due))
+        due = max(due, time.perf_counter()) + rng.random() * 0.004
+
+
+def workload(clients, requests, large_ratio, seed):
+    rng = random.Random(seed)
+    texts = corpus.load(1.0)
+    article = texts['article']
+    short = texts['short']
+    payloads = []
+    for _ in range(clients):
+        payload = []
+        for _ in range(requests):
+            if rng.random() < large_ratio:
+                start = rng.randrange(len(article) - 20000)
+                payload.append(article[start:start + 20000])
+            else:
+                payload.append(rng.choice(short))
+        payloads.append(payload)
+    return payloads
+
+
+def percentile(values, p):
+    values = sorted(values)
+    if not values:
+        return 0.0
+    return values[min(len(values) - 1, int(p / 100.0 * len(values)))]
+
+
+async def run(convert, payloads, seed):
+    latencies = []
+    start = time.perf_counter()
+    await asyncio.gather(*[client(convert, payload, latencies, random.Random(seed + i))
+                           for i, payload in enumerate(payloads)])
+    return time.perf_counter() - start, latencies
+
+
+def report(name, elapsed, latencies):
+    small = [seconds for size, seconds in latencies if size <= aio.INLINE_CHARS]
+    every = [seconds for size, seconds in latencies]
+    print('%-8s %6.2fs  small p50 %7.2fms p99 %7.2fms  all p50 %7.2fms p99 %7.2fms' % (
+        name, elapsed, percentile(small, 50) * 1e3, percentile(small, 99) * 1e3,
+        percentile(every, 50) * 1e3, percentile(every, 99) * 1e3))
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--clients', type=int, default=32)
+    parser.add_argument('--requests', type=int, default=50, help='requests per client')
+    parser.add_argument('--large-ratio', type=float, default=0.05, help='share of 20000 character requests')
+    parser.add_argument('--limit', type=int, help='conversions in flight on the executor')
+    parser.add_argument('--seed', type=int, default=0)
+    args = parser.parse_args()
+
+    payloads = workload(args.clients, args.requests, args.large_ratio, args.seed)
+    if args.limit:
+        aio.set_executor(None, limit=args.limit)
+    # start the pool before measuring
+    asyncio.run(aio.aconvert(payloads[0][0], inline_chars=0))
+    for name, convert in (('inline', inline), ('aconvert', aio.aconvert)):
+        elapsed, latencies = asyncio.run(run(convert, payloads, args.seed))
+        report(name, elapsed, latencies)
+    aio.shutdown()
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,72 @@
+""" times legacy_reorder.reorder and the other reorder backends on multi-megabyte inputs
+
+    $ python benchmarks/bench_reorder.py
+    $ python benchmarks/bench_reorder.py --baseline /path/to/older/kfc/checkout
+"""
+import argparse
+import importlib.util
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+
+from kfc import backend  # noqa: E402
+from kfc.utils import legacy_reorder  # noqa: E402
+
+
+PARAGRAPH = (
+    'ថ្ងៃខែឆ្នាំកំណើត ខ្ញុំបានទៅសាលារៀននៅព្រឹកនេះ។ '
+    'ក្រុមហ៊ុននេះផលិតនំប៉័ងនិងស៊ីម៉ងត៍ សម្រាប់ប្រជាពលរដ្ឋទូទាំងប្រទេសកម្ពុជា។ '
+    'ស្ត្រីម្នាក់កំពុងលក់ផ្លែឈើនៅផ្សារ welcome to Phnom Penh ២០២៤។ '
+    'កញ្ច្រៀវ ព្រះរាជាណាចក្រ ចំពោះ នុ៎ះ អ៊ុំ ប្រាំ ប៉ៅ ម៉្ងៃ។\n'
+)
+
+
+def load_baseline(path):
+    """ import legacy_reorder from another checkout of the package """
+    filename = os.path.join(path, 'kfc', 'utils', 'legacy_reorder.py')
+    spec = importlib.util.spec_from_file_location('baseline_legacy_reorder', filename)
+    module = importlib.util.module_from_spec(spec)
+    spec.loader.exec_module(module)
+    return module
+
+
+def best_of(function, text, repeat):
+    best = float('inf')
+    for _ in range(repeat):
+        start = time.perf_counter()
+        function(text)
+        best = min(best, time.perf_counter() - start)
+    return best
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--sizes', type=float, nargs='+', default=[1, 2, 4], help='input sizes in megabytes')
+    parser.add_argument('--repeat', type=int, default=3)
+    parser.add_argument('--baseline', help='checkout of kfc to compare against')
+    args = parser.parse_args()
+
+    baseline = load_baseline(args.baseline) if args.baseline else None
+    for size in args.sizes:
+        text = PARAGRAPH * max(1, int(size * 1024 * 1024 / len(PARAGRAPH.encode('utf-8'))))
+        megabytes = len(text.encode('utf-8')) / 1024 / 1024
+        elapsed = best_of(legacy_reorder.reorder, text, args.repeat)
+        line = '%6.2f MB  reorder %7.3fs  %6.2f MB/s' % (megabytes, elapsed, megabytes / elapsed)
+        for name in backend.available_backends()[1:]:
+            function = backend._load(name)
+            if function(text) != legacy_reorder.reorder(text):
+                sys.exit(name + ' backend output differs')
+            seconds = best_of(function, text, args.repeat)
+            line += '  %s %7.3fs  x%.1f' % (name, seconds, elapsed / seconds)
+        if baseline is not None:
+            if baseline.reorder(text) != legacy_reorder.reorder(text):
+                sys.exit('baseline output differs')
+            reference = best_of(baseline.reorder, text, args.repeat)
+            line += '  baseline %7.3fs  speedup x%.1f' % (reference, reference / elapsed)
+        print(line)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,75 @@
+""" throughput of one shared conversion engine from 1 to N threads
+
+    $ python benchmarks/bench_threads.py
+    $ python3.13t -X gil=0 benchmarks/bench_threads.py --threads 1 2 4 8 16
+
+On a build with the GIL the throughput stays flat, on a free-threaded build it should grow with the cores.
+"""
+import argparse
+import os
+import sys
+import threading
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+
+import corpus  # noqa: E402
+from kfc.convert import UNICODE_TO_LIMON, LIMON_TO_UNICODE  # noqa: E402
+from kfc.engine import get_engine  # noqa: E402
+
+
+def gil_enabled():
+    is_enabled = getattr(sys, '_is_gil_enabled', None)
+    return True if is_enabled is None else is_enabled()
+
+
+def run(function, documents, threads):
+    """ convert every document, spread over threads started together, and return the elapsed seconds """
+    barrier = threading.Barrier(threads + 1)
+
+    def work(part):
+        barrier.wait()
+        for document in part:
+            function(document)
+
+    workers = [threading.Thread(target=work, args=(documents[i::threads],)) for i in range(threads)]
+    for worker in workers:
+        worker.start()
+    barrier.wait()
+    start = time.perf_counter()
+    for worker in workers:
+        worker.join()
+    return time.perf_counter() - start
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--threads', type=int, nargs='+', default=[1, 2, 4, os.cpu_count() or 1])
+    parser.add_argument('--direction', choices=[UNICODE_TO_LIMON, LIMON_TO_UNICODE], default=UNICODE_TO_LIMON)
+    parser.add_argument('--documents', type=int, default=16, help='number of documents converted per run')
+    parser.add_argument('--scale', type=float, default=0.2, help='size of the documents, 1.0 is 500000 chars')
+    parser.add_argument('--repeat', type=int, default=3)
+    args = parser.parse_args()
+
+    engine = get_engine()
+    article = corpus.load(args.scale)['article']
+    if args.direction == LIMON_TO_UNICODE:
+        article = engine.unicode_to_limon(article)
+    function = getattr(engine, args.direction)
+    documents = [article[i % 97:] + article[:i % 97] for i in range(args.documents)]
+    chars = sum(len(document) for document in documents)
+    function(documents[0])
+
+    print('%s, gil %s, %d cpus, %d documents of %d chars'
+          % (args.direction, 'enabled' if gil_enabled() else 'disabled', os.cpu_count() or 1, len(documents),
+             len(article)))
+    single = None
+    for threads in sorted(set(args.threads)):
+        elapsed = min(run(function, documents, threads) for _ in range(args.repeat))
+        throughput = chars / elapsed / 1e6
+        single = single or throughput
+        print('%3d threads  %7.3fs  %6.2f Mchars/s  x%.2f' % (threads, elapsed, throughput, throughput / single))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,110 @@
+""" reproducible khmer corpus for the benchmarks, generated from a fixed seed """
+import random
+
+
+WORDS = [
+    'ថ្ងៃ', 'ខែ', 'ឆ្នាំ', 'កំណើត', 'ខ្ញុំ', 'បាន', 'ទៅ', 'សាលារៀន', 'នៅ', 'ព្រឹក', 'នេះ', 'ក្រុមហ៊ុន',
+    'ផលិត', 'នំប៉័ង', 'និង', 'ស៊ីម៉ងត៍', 'សម្រាប់', 'ប្រជាពលរដ្ឋ', 'ទូទាំង', 'ប្រទេស', 'កម្ពុជា', 'ស្ត្រី',
+    'ម្នាក់', 'កំពុង', 'លក់', 'ផ្លែឈើ', 'ផ្សារ', 'កញ្ច្រៀវ', 'ព្រះរាជាណាចក្រ', 'ចំពោះ', 'នុ៎ះ', 'អ៊ុំ', 'ប្រាំ',
+    'ប៉ៅ', 'ម៉្ងៃ', 'ក្រសួង', 'អប់រំ', 'យុវជន', 'កីឡា', 'ខេត្ត', 'សៀមរាប', 'បាត់ដំបង', 'ព្រះសីហនុ', 'រដ្ឋាភិបាល',
+    'សេដ្ឋកិច្ច', 'វប្បធម៌', 'ប្រវត្តិសាស្ត្រ', 'ការសិក្សា', 'សុខភាព', 'ពលរដ្ឋ', 'ញ្ញា', 'ឫស្សី', 'ឬ', 'ឮ', 'ប៊ិច',
+]
+LATIN = ['welcome', 'to', 'Phnom', 'Penh', 'the', 'report', 'https://example.com/a?b=1', 'COVID-19', '2024', 'USD',
+         '(note)', 'e-mail:', 'info@example.com', '50%', 'and', 'of']
+PUNCTUATION = ['។', '៕', ' ', ' ', ' ', '​', ', ', '៖ ', '!', '«', '»']
+DIGITS = '០១២៣៤៥៦៧៨៩'
+
+CONSONANTS = [chr(c) for c in range(0x1780, 0x17A3)]
+VOWELS = [chr(c) for c in range(0x17B6, 0x17C6)]
+SIGNS = ['ំ', 'ះ', '់', '៉', '៊', '័', '៍', '៏', 'ៈ']
+MARKS = VOWELS + SIGNS + ['្', '៌', '៎', '៑']
+
+
+def _syllable(rnd):
+    cluster = rnd.choice(CONSONANTS)
+    if rnd.random() < 0.3:
+        cluster += '្' + rnd.choice(CONSONANTS)
+    if rnd.random() < 0.05:
+        cluster += '៉៊'[rnd.random() < 0.5]
+    if rnd.random() < 0.6:
+        cluster += rnd.choice(VOWELS)
+    if rnd.random() < 0.2:
+        cluster += rnd.choice('ំះ់')
+    return cluster
+
+
+def _word(rnd):
+    if rnd.random() < 0.7:
+        return rnd.choice(WORDS)
+    return ''.join(_syllable(rnd) for _ in range(rnd.randint(1, 4)))
+
+
+def _sentence(rnd, latin=0.0):
+    words = []
+    for _ in range(rnd.randint(4, 20)):
+        if rnd.random() < latin:
+            words.append(' ' + rnd.choice(LATIN) + ' ')
+        elif rnd.random() < 0.05:
+            words.append(''.join(rnd.choice(DIGITS) for _ in range(rnd.randint(1, 4))))
+        else:
+            words.append(_word(rnd))
+        if rnd.random() < 0.3:
+            words.append(rnd.choice(PUNCTUATION))
+    return ''.join(words) + '។ '
+
+
+def short(count=20000, seed=1):
+    """ short records such as names and titles """
+    rnd = random.Random(seed)
+    return [' '.join(_word(rnd) for _ in range(rnd.randint(1, 4))) for _ in range(count)]
+
+
+def article(size=500000, seed=2):
+    """ one long text of about size characters """
+    rnd = random.Random(seed)
+    parts = []
+    length = 0
+    while length < size:
+        sentence = _sentence(rnd)
+        if rnd.random() < 0.1:
+            sentence += '\n'
+        parts.append(sentence)
+        length += len(sentence)
+    return ''.join(parts)
+
+
+def mixed(size=500000, seed=3):
+    """ khmer text with a large share of latin words, urls and numbers """
+    rnd = random.Random(seed)
+    parts = []
+    length = 0
+    while length < size:
+        sentence = _sentence(rnd, latin=0.4)
+        parts.append(sentence)
+        length += len(sentence)
+    return ''.join(parts)
+
+
+def malformed(size=200000, seed=4):
+    """ stray marks, incomplete coengs and repeated vowels that fall back to DOTCIRCLE clusters """
+    rnd = random.Random(seed)
+    parts = []
+    length = 0
+    while length < size:
+        if rnd.random() < 0.5:
+            part = ''.join(rnd.choice(MARKS) for _ in range(rnd.randint(1, 6)))
+        else:
+            part = rnd.choice(CONSONANTS) + ('្' * rnd.randint(1, 3)) + ''.join(rnd.choice(VOWELS) for _ in range(2))
+        parts.append(part)
+        length += len(part)
+    return ''.join(parts)
+
+
+def load(scale=1.0):
+    """ every category of the corpus, scale multiplies their size """
+    return {
+        'short': short(int(20000 * scale)),
+        'article': article(int(500000 * scale)),
+        'mixed': mixed(int(500000 * scale)),
+        'malformed': malformed(int(200000 * scale)),
+    }
@@ -0,0 +1,123 @@
+""" throughput and memory benchmark of the converters, with regression gates
+
+    $ python benchmarks/run.py --save baseline.json
+    $ python benchmarks/run.py --compare baseline.json --threshold 0.1
+"""
+import argparse
+import json
+import os
+import platform
+import sys
+import time
+import tracemalloc
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+
+import corpus  # noqa: E402
+from kfc import limon_to_unicode, unicode_to_limon  # noqa: E402
+from kfc.utils import legacy_reorder  # noqa: E402
+
+
+FUNCTIONS = {
+    'unicode_to_limon': unicode_to_limon,
+    'limon_to_unicode': limon_to_unicode,
+    'reorder': legacy_reorder.reorder,
+    'is_well_formed': legacy_reorder.is_well_formed,
+}
+
+
+def inputs(function, texts):
+    """ the corpus in the encoding a function expects """
+    if function == 'limon_to_unicode':
+        return dict((name, [unicode_to_limon(text) for text in value] if isinstance(value, list)
+                     else unicode_to_limon(value)) for name, value in texts.items())
+    return texts
+
+
+def run_once(function, value):
+    if isinstance(value, list):
+        for text in value:
+            function(text)
+    else:
+        function(value)
+
+
+def measure(function, value, repeat):
+    """ best time over repeat runs, and the peak of memory allocated by one run """
+    best = float('inf')
+    for _ in range(repeat):
+        start = time.perf_counter()
+        run_once(function, value)
+        best = min(best, time.perf_counter() - start)
+    tracemalloc.start()
+    run_once(function, value)
+    peak = tracemalloc.get_traced_memory()[1]
+    tracemalloc.stop()
+    return best, peak
+
+
+def benchmark(names, scale, repeat):
+    texts = corpus.load(scale)
+    results = {}
+    for name in names:
+        function = FUNCTIONS[name]
+        for category, value in inputs(name, texts).items():
+            chars = sum(map(len, value)) if isinstance(value, list) else len(value)
+            elapsed, peak = measure(function, value, repeat)
+            results[name + '/' + category] = {
+                'chars': chars,
+                'seconds': elapsed,
+                'chars_per_second': chars / elapsed,
+                'peak_bytes': peak,
+            }
+    return results
+
+
+def compare(results, baseline, threshold):
+    """ return the names of the benchmarks that got slower than the baseline by more than threshold """
+    regressions = []
+    for name, result in sorted(results.items()):
+        if name not in baseline:
+            continue
+        before = baseline[name]['chars_per_second']
+        ratio = result['chars_per_second'] / before
+        flag = ''
+        if ratio < 1 - threshold:
+            regressions.append(name)
+            flag = '  REGRESSION'
+        print('%-32s %12.0f -> %12.0f chars/s  x%.2f%s' % (name, before, result['chars_per_second'], ratio, flag))
+    return regressions
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--functions', nargs='+', choices=list(FUNCTIONS), default=list(FUNCTIONS))
+    parser.add_argument('--scale', type=float, default=1.0, help='multiplies the size of the corpus')
+    parser.add_argument('--repeat', type=int, default=3)
+    parser.add_argument('--save', help='write the results to this json file')
+    parser.add_argument('--compare', help='json file of an earlier run to compare with')
+    parser.add_argument('--threshold', type=float, default=0.1, help='tolerated loss of throughput, 0.1 is 10%%')
+    args = parser.parse_args()
+
+    results = benchmark(args.functions, args.scale, args.repeat)
+    for name, result in sorted(results.items()):
+        print('%-32s %10d chars %8.3fs %12.0f chars/s %10d peak bytes' % (
+            name, result['chars'], result['seconds'], result['chars_per_second'], result['peak_bytes']))
+
+    if args.save:
+        with open(args.save, 'w') as f:
+            json.dump({'python': platform.python_version(), 'scale': args.scale, 'results': results}, f, indent=2)
+
+    if args.compare:
+        with open(args.compare) as f:
+            baseline = json.load(f)
+        if baseline.get('scale') != args.scale:
+            print('warning: baseline was run with scale %s' % baseline.get('scale'))
+        print()
+        regressions = compare(results, baseline['results'], args.threshold)
+        if regressions:
+            sys.exit('%d benchmarks regressed by more than %d%%' % (len(regressions), args.threshold * 100))
+
+
+if __name__ == '__main__':
+    main()
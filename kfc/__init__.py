@@ -1,2 +1,31 @@
+import importlib
 from .limon_to_unicode import limon_to_unicode
 from .unicode_to_limon import unicode_to_limon
+from .convert import UNICODE_TO_LIMON, LIMON_TO_UNICODE, convert
+from .fonts import available_fonts, get_font, register_font
+from .stream import convert_stream, iter_convert
+from .incremental import IncrementalConverter
+from .engine import Engine, get_engine
+from .search import Query, NgramIndex, compile_query, search_file
+from .detect import Detector, get_detector, limon_spans
+from .utils.cache import ConversionCache
+from .utils.legacy_reorder import iter_clusters, is_well_formed, malformed_clusters
+from .utils.normalization import normalize
+from . import instrument
+from .backend import available_backends, get_backend, set_backend
+
+# entry points whose module pulls in heavy standard library packages, imported on first use
+_lazy = {
+    'convert_many': '.batch',
+    'convert_document': '.document',
+    'aconvert': '.aio',
+    'aiter_convert': '.aio',
+}
+
+
+def __getattr__(name):
+    if name in _lazy:
+        value = getattr(importlib.import_module(_lazy[name], __name__), name)
+        globals()[name] = value
+        return value
+    raise AttributeError('module ' + repr(__name__) + ' has no attribute ' + repr(name))
@@ -0,0 +1,195 @@
+"""
+asyncio wrappers of the converters.
+Inputs of at most INLINE_CHARS characters are converted inline, larger ones on a shared executor
+with at most limit conversions in flight, further callers wait for a slot.
+"""
+import asyncio
+import os
+import threading
+import unittest
+import weakref
+from concurrent.futures import ProcessPoolExecutor
+from .convert import UNICODE_TO_LIMON, LIMON_TO_UNICODE, convert, get_direction
+from .limon_to_unicode import limon_to_unicode
+from .stream import MAX_CARRY, carry_over
+from .unicode_to_limon import unicode_to_limon
+
+
+# under a millisecond of conversion, below it a round trip to the executor costs more than it saves
+INLINE_CHARS = 512
+
+_lock = threading.Lock()
+_executor = None
+_owned = False
+_limit = None
+_semaphores = weakref.WeakKeyDictionary()
+
+
+def set_executor(executor=None, limit=None):
+    """
+    use executor for the conversions of large inputs, with at most limit of them in flight per event loop
+    the default is a pool of os.cpu_count() processes started on first use and twice as many conversions in flight
+    """
+    global _executor, _owned, _limit
+    if limit is not None and limit < 1:
+        raise ValueError('limit must be positive')
+    with _lock:
+        previous, owned = _executor, _owned
+        _executor, _owned, _limit = executor, False, limit
+        _semaphores.clear()
+    if owned and previous is not executor:
+        previous.shutdown(wait=False)
+
+
+def get_executor():
+    """ return the shared executor, starting the default process pool if none was set """
+    global _executor, _owned
+    with _lock:
+        if _executor is None:
+            _executor = ProcessPoolExecutor(max_workers=os.cpu_count() or 1)
+            _owned = True
+        return _executor
+
+
+def shutdown(wait=True):
+    """ shut the default process pool down, it is started again on the next large conversion """
+    global _executor, _owned
+    with _lock:
+        executor, owned = _executor, _owned
+        if owned:
+            _executor, _owned = None, False
+    if owned:
+        executor.shutdown(wait=wait)
+
+
+def _semaphore(loop, executor):
+    semaphore = _semaphores.get(loop)
+    if semaphore is None:
+        limit = _limit or 2 * (getattr(executor, '_max_workers', None) or os.cpu_count() or 1)
+        semaphore = _semaphores[loop] = asyncio.Semaphore(limit)
+    return semaphore
+
+
+async def _offload(function, *args, **kwargs):
+    loop = asyncio.get_running_loop()
+    executor = get_executor()
+    semaphore = _semaphore(loop, executor)
+    await semaphore.acquire()
+    try:
+        future = executor.submit(function, *args, **kwargs)
+    except BaseException:
+        semaphore.release()
+        raise
+
+    def release(_):
+        # the slot is held until the work is really done, a cancelled caller does not free it early
+        try:
+            loop.call_soon_threadsafe(semaphore.release)
+        except RuntimeError:
+            pass
+
+    future.add_done_callback(release)
+    # cancelling the caller cancels the conversion if it has not started yet
+    return await asyncio.wrap_future(future)
+
+
+async def aconvert(text, direction=UNICODE_TO_LIMON, inline_chars=INLINE_CHARS, **kwargs):
+    """
+    convert text in the given direction without blocking the event loop
+    kwargs are passed to the converter and must be picklable when the executor is a process pool
+    """
+    converter = get_direction(direction)[0]
+    if len(text) <= inline_chars:
+        return converter(text, **kwargs)
+    return await _offload(convert, text, direction, **kwargs)
+
+
+async def aiter_convert(chunks, direction=UNICODE_TO_LIMON, inline_chars=INLINE_CHARS, max_carry=MAX_CARRY):
+    """
+    asynchronous form of stream.iter_convert, chunks is an iterable or an asynchronous iterable of text chunks
+    the next chunk is not read before the previous one is converted
+    """
+    boundary = get_direction(direction)[1]
+    carry = ''
+    async for chunk in _aiter(chunks):
+        if not chunk:
+            continue
+        text, carry = carry_over(carry, chunk, boundary, max_carry)
+        if text:
+            yield await aconvert(text, direction, inline_chars)
+    if carry:
+        yield await aconvert(carry, direction, inline_chars)
+
+
+async def _aiter(chunks):
+    if hasattr(chunks, '__aiter__'):
+        async for chunk in chunks:
+            yield chunk
+    else:
+        for chunk in chunks:
+            yield chunk
+
+
+class TestAio(unittest.TestCase):
+
+    UNICODE = u'ថ្ងៃខែឆ្នាំកំណើត ខ្ញុំ កញ្ច្រៀវ ស្ត្រី ប្រាំ, ប៉ៅ នុ៎ះ អ៊ុំ ម៉្ងៃ នំប៉័ង។ welcome ' * 3
+
+    @classmethod
+    def setUpClass(cls):
+        from concurrent.futures import ThreadPoolExecutor
+        cls.executor = ThreadPoolExecutor(max_workers=2)
+        set_executor(cls.executor, limit=2)
+
+    @classmethod
+    def tearDownClass(cls):
+        set_executor(None)
+        cls.executor.shutdown()
+
+    def testAconvert(self):
+        async def run():
+            small = await aconvert(u'ខ្ញុំ')
+            large = await asyncio.gather(*[aconvert(self.UNICODE, inline_chars=10) for _ in range(5)])
+            back = await aconvert(large[0], LIMON_TO_UNICODE, inline_chars=10)
+            return small, large, back
+        small, large, back = asyncio.run(run())
+        self.assertEqual(small, u'´')
+        self.assertEqual(large, [unicode_to_limon(self.UNICODE)] * 5)
+        self.assertEqual(back, limon_to_unicode(large[0]))
+
+    def testAiterConvert(self):
+        async def chunks():
+            for i in range(0, len(self.UNICODE), 7):
+                yield self.UNICODE[i:i + 7]
+
+        async def run():
+            return ''.join([limon async for limon in aiter_convert(chunks(), inline_chars=5)])
+        self.assertEqual(asyncio.run(run()), unicode_to_limon(self.UNICODE))
+
+        # stray vowels never end a cluster, the carry is cut at max_carry
+        async def vowels():
+            return [limon async for limon in aiter_convert([u'ា' * 64] * 100, max_carry=256)]
+        converted = asyncio.run(vowels())
+        self.assertGreater(len(converted), 10)
+        self.assertEqual(''.join(converted), unicode_to_limon(u'ា' * 6400))
+
+    def testCancel(self):
+        async def run():
+            tasks = [asyncio.ensure_future(aconvert(self.UNICODE * 50, inline_chars=10)) for _ in range(6)]
+            await asyncio.sleep(0)
+            tasks[-1].cancel()
+            results = await asyncio.gather(*tasks, return_exceptions=True)
+            # every slot is given back
+            await asyncio.sleep(0.05)
+            return results, _semaphores[asyncio.get_running_loop()]._value
+        results, free = asyncio.run(run())
+        self.assertIsInstance(results[-1], asyncio.CancelledError)
+        self.assertEqual(results[:5], [unicode_to_limon(self.UNICODE * 50)] * 5)
+        self.assertEqual(free, 2)
+
+    def testUnknownDirection(self):
+        with self.assertRaises(ValueError):
+            asyncio.run(aconvert(u'ក', 'limon_to_abc'))
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,95 @@
+"""
+Implementation of the reordering stage used by unicode_to_limon.
+PYTHON runs the state machine of utils.legacy_reorder, NUMPY the array version in utils.vectorized, which
+needs numpy and only pays off on texts of thousands of characters. AUTO picks NUMPY when numpy is installed.
+The KFC_BACKEND environment variable selects the backend on import, set_backend updates it for worker processes.
+"""
+import os
+import unittest
+import warnings
+from .utils import legacy_reorder
+
+
+PYTHON = 'python'
+NUMPY = 'numpy'
+AUTO = 'auto'
+
+reorder = legacy_reorder.reorder
+_name = PYTHON
+
+
+def _load(name):
+    """ return the reorder function of a backend """
+    if name == PYTHON:
+        return legacy_reorder.reorder
+    if name == NUMPY:
+        try:
+            from .utils import vectorized
+        except ImportError as e:
+            raise ValueError('the numpy backend needs numpy: ' + str(e))
+        return vectorized.reorder
+    raise ValueError('unknown backend ' + repr(name) + ', expected one of ' + ', '.join((PYTHON, NUMPY, AUTO)))
+
+
+def available_backends():
+    """ names of the backends that can be used here """
+    names = [PYTHON]
+    try:
+        _load(NUMPY)
+        names.append(NUMPY)
+    except ValueError:
+        pass
+    return names
+
+
+def set_backend(name):
+    """ use the backend name for the reorder stage of the following conversions """
+    global reorder, _name
+    if name == AUTO:
+        name = available_backends()[-1]
+    reorder = _load(name)
+    _name = name
+    os.environ['KFC_BACKEND'] = name
+
+
+def get_backend():
+    return _name
+
+
+if os.environ.get('KFC_BACKEND'):
+    try:
+        set_backend(os.environ['KFC_BACKEND'])
+    except ValueError as e:
+        warnings.warn('KFC_BACKEND ignored, ' + str(e))
+
+
+class TestBackend(unittest.TestCase):
+
+    def tearDown(self):
+        set_backend(PYTHON)
+
+    def testSelect(self):
+        from .unicode_to_limon import unicode_to_limon
+        text = u'ថ្ងៃខែឆ្នាំកំណើត ខ្ញុំ កញ្ច្រៀវ ស្ត្រី ប្រាំ, ប៉ៅ នុ៎ះ អ៊ុំ ម៉្ងៃ នំប៉័ង។ welcome ' * 100
+        expected = unicode_to_limon(text)
+        for name in available_backends() + [AUTO]:
+            set_backend(name)
+            self.assertIn(get_backend(), available_backends())
+            self.assertEqual(unicode_to_limon(text), expected)
+        with self.assertRaises(ValueError):
+            set_backend('cuda')
+        self.assertEqual(get_backend(), available_backends()[-1])
+
+    def testSameAsPython(self):
+        import random
+        rng = random.Random(0)
+        alphabet = [chr(code) for code in range(0x1780, 0x17F0)] + list(u' a,\u200b')
+        texts = [''.join(rng.choice(alphabet) for _ in range(2048 + rng.randrange(1000))) for _ in range(20)]
+        for name in available_backends():
+            function = _load(name)
+            for text in texts:
+                self.assertEqual(function(text), legacy_reorder.reorder(text))
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,81 @@
+import os
+import unittest
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+from itertools import chain, islice
+from .convert import UNICODE_TO_LIMON, LIMON_TO_UNICODE, get_converter
+from .unicode_to_limon import unicode_to_limon
+
+
+def _convert_batch(direction, texts):
+    convert = get_converter(direction)
+    return [convert(text) for text in texts]
+
+
+def _batches(texts, size):
+    while True:
+        batch = list(islice(texts, size))
+        if not batch:
+            return
+        yield batch
+
+
+def convert_many(texts, direction=UNICODE_TO_LIMON, workers=None, chunksize=1024, min_parallel=None):
+    """
+    Convert an iterable of strings over a pool of worker processes, yielding the results lazily in input order.
+    Workers receive batches of chunksize strings so that pickling is paid once per batch.
+    When workers is 1 or there are fewer than min_parallel strings (default: two batches), no pool is started.
+    """
+    convert = get_converter(direction)
+    if workers is None:
+        workers = os.cpu_count() or 1
+    if workers < 1 or chunksize < 1:
+        raise ValueError('workers and chunksize must be positive')
+    if min_parallel is None:
+        min_parallel = 2 * chunksize
+    return _convert_many(iter(texts), direction, convert, workers, chunksize, min_parallel)
+
+
+def _convert_many(texts, direction, convert, workers, chunksize, min_parallel):
+    head = list(islice(texts, min_parallel)) if workers > 1 else []
+    if workers == 1 or len(head) < min_parallel:
+        for text in chain(head, texts):
+            yield convert(text)
+        return
+
+    pending = deque()
+    executor = ProcessPoolExecutor(max_workers=workers)
+    try:
+        for batch in _batches(chain(head, texts), chunksize):
+            pending.append(executor.submit(_convert_batch, direction, batch))
+            # keep a bounded number of batches in flight so the input is consumed lazily
+            if len(pending) >= 2 * workers:
+                yield from pending.popleft().result()
+        while pending:
+            yield from pending.popleft().result()
+    finally:
+        for future in pending:
+            future.cancel()
+        executor.shutdown(wait=True)
+
+
+class TestConvertMany(unittest.TestCase):
+
+    TEXTS = [u'ថ្ងៃខែឆ្នាំកំណើត', u'ខ្ញុំ', u'កញ្ច្រៀវ', u'ស្ត្រី', u'welcome', u''] * 20
+
+    def testSerial(self):
+        self.assertEqual(list(convert_many(self.TEXTS, workers=1)), [unicode_to_limon(text) for text in self.TEXTS])
+
+    def testParallelKeepsOrder(self):
+        limon = [unicode_to_limon(text) for text in self.TEXTS]
+        self.assertEqual(list(convert_many(self.TEXTS, workers=2, chunksize=7, min_parallel=0)), limon)
+        self.assertEqual(list(convert_many(limon, LIMON_TO_UNICODE, workers=2, chunksize=7, min_parallel=0)),
+                         list(convert_many(limon, LIMON_TO_UNICODE, workers=1)))
+
+    def testUnknownDirection(self):
+        with self.assertRaises(ValueError):
+            convert_many(self.TEXTS, 'limon_to_abc')
+
+
+if __name__ == '__main__':
+    unittest.main()
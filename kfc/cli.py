@@ -0,0 +1,290 @@
+""" kfc command line tool, converts files and directory trees between unicode and limon,
+kfc serve runs a conversion server and kfc search searches limon files """
+import argparse
+import codecs
+import fnmatch
+import mmap
+import os
+import shutil
+import sys
+import tempfile
+import time
+import unittest
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+from .convert import UNICODE_TO_LIMON, LIMON_TO_UNICODE, DIRECTIONS, get_direction
+from .stream import convert_stream
+from .unicode_to_limon import unicode_to_limon
+
+
+# how far back from a shard end to look for a cluster boundary
+SHARD_WINDOW = 4096
+
+
+def _is_utf8(encoding):
+    return codecs.lookup(encoding).name == 'utf-8'
+
+
+def _is_single_byte(encoding):
+    return len(b'\xe1\x9e\x80'.decode(encoding, errors='replace')) == 3
+
+
+def _char_start(data, offset, encoding):
+    """ move offset back to the first byte of a character """
+    if _is_utf8(encoding):
+        while offset > 0 and (data[offset] & 0xC0) == 0x80:
+            offset -= 1
+    return offset
+
+
+def find_shards(path, direction, encoding, shard_size):
+    """ split a file into (start, end) byte ranges that end on cluster boundaries """
+    size = os.path.getsize(path)
+    if size <= shard_size or not (_is_utf8(encoding) or _is_single_byte(encoding)):
+        return [(0, size)]
+    boundary = get_direction(direction)[1]
+    shards = []
+    with open(path, 'rb') as f, mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as data:
+        start = 0
+        length = shard_size
+        while size - start > length:
+            end = _char_start(data, start + length, encoding)
+            window_start = _char_start(data, max(start, end - SHARD_WINDOW), encoding)
+            window = data[window_start:end].decode(encoding)
+            cut = boundary(window)
+            if cut:
+                end = window_start + len(window[:cut].encode(encoding))
+                shards.append((start, end))
+                start = end
+                length = shard_size
+            else:
+                # no boundary in the window, let this shard grow
+                length += SHARD_WINDOW
+        shards.append((start, size))
+    return shards
+
+
+def _convert_shard(path, start, end, direction, encoding):
+    if start == end:
+        # an empty file cannot be mapped
+        return b''
+    convert = get_direction(direction)[0]
+    with open(path, 'rb') as f, mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as data:
+        text = data[start:end].decode(encoding)
+    return convert(text).encode(encoding)
+
+
+def _convert_file(source, target, direction, encoding):
+    convert = get_direction(direction)[0]
+    with open(source, 'rb') as f:
+        data = f.read()
+    converted = convert(data.decode(encoding)).encode(encoding)
+    _makedirs(target)
+    with open(target, 'wb') as f:
+        f.write(converted)
+    return len(data)
+
+
+def _makedirs(path):
+    directory = os.path.dirname(path)
+    if directory:
+        os.makedirs(directory, exist_ok=True)
+
+
+def collect_files(inputs, output, include):
+    """ return the (source, target) pairs to convert, target is None for stdout """
+    pairs = []
+    for source in inputs:
+        if os.path.isdir(source):
+            if output is None:
+                raise ValueError('an output directory is required to convert the directory ' + source)
+            target_root = os.path.join(output, os.path.basename(os.path.normpath(source))) if len(inputs) > 1 else output
+            for root, dirs, files in os.walk(source):
+                dirs.sort()
+                for name in sorted(fnmatch.filter(files, include)):
+                    path = os.path.join(root, name)
+                    pairs.append((path, os.path.join(target_root, os.path.relpath(path, source))))
+        elif os.path.isfile(source) or source == '-':
+            if output is None or output == '-':
+                target = None
+            elif len(inputs) > 1 or os.path.isdir(output):
+                target = os.path.join(output, os.path.basename(source))
+            else:
+                target = output
+            pairs.append((source, target))
+        else:
+            raise ValueError('no such file or directory: ' + source)
+    if sum(1 for source, target in pairs if target is None) > 1:
+        raise ValueError('an output directory is required to convert more than one file')
+    for source, target in pairs:
+        if target is not None and source != '-' and os.path.exists(target) and os.path.samefile(source, target):
+            raise ValueError('refusing to overwrite the input file ' + source)
+    return pairs
+
+
+def _open_target(target, encoding):
+    # newline='' keeps the line endings of the input as they are, like the byte level conversions
+    if target is None:
+        return open(sys.stdout.fileno(), 'w', encoding=encoding, newline='', closefd=False)
+    _makedirs(target)
+    return open(target, 'w', encoding=encoding, newline='')
+
+
+def _convert_serial(source, target, direction, encoding):
+    """ stream one file in the current process """
+    if source == '-':
+        reader = open(sys.stdin.fileno(), encoding=encoding, newline='', closefd=False)
+    else:
+        reader = open(source, encoding=encoding, newline='')
+    with reader, _open_target(target, encoding) as writer:
+        convert_stream(reader, writer, direction)
+    return 0 if source == '-' else os.path.getsize(source)
+
+
+def _convert_sharded(executor, source, target, direction, encoding, shard_size, jobs):
+    """ convert the shards of one large file on the pool and write them back in order """
+    shards = find_shards(source, direction, encoding, shard_size)
+    pending = deque()
+    with (open(sys.stdout.fileno(), 'wb', closefd=False) if target is None else _open_binary(target)) as writer:
+        for start, end in shards:
+            pending.append(executor.submit(_convert_shard, source, start, end, direction, encoding))
+            if len(pending) >= 2 * jobs:
+                writer.write(pending.popleft().result())
+        while pending:
+            writer.write(pending.popleft().result())
+    return os.path.getsize(source)
+
+
+def _open_binary(target):
+    _makedirs(target)
+    return open(target, 'wb')
+
+
+def run(pairs, direction, encoding='utf-8', jobs=1, shard_size=4 * 1024 * 1024):
+    """ convert every (source, target) pair, return the number of bytes read """
+    if jobs <= 1:
+        return sum(_convert_serial(source, target, direction, encoding) for source, target in pairs)
+
+    total = 0
+    small = []
+    with ProcessPoolExecutor(max_workers=jobs) as executor:
+        for source, target in pairs:
+            if source == '-':
+                total += _convert_serial(source, target, direction, encoding)
+            elif target is None or os.path.getsize(source) > shard_size:
+                total += _convert_sharded(executor, source, target, direction, encoding, shard_size, jobs)
+            else:
+                small.append((source, target))
+        if small:
+            sources, targets = zip(*small)
+            chunksize = max(1, len(small) // (4 * jobs))
+            total += sum(executor.map(_convert_file, sources, targets, [direction] * len(small),
+                                      [encoding] * len(small), chunksize=chunksize))
+    return total
+
+
+def main(argv=None):
+    argv = sys.argv[1:] if argv is None else list(argv)
+    if argv[:1] == ['serve']:
+        from .server import main as serve
+        return serve(argv[1:])
+    if argv[:1] == ['search']:
+        from .search import main as search
+        return search(argv[1:])
+    parser = argparse.ArgumentParser(prog='kfc', description=__doc__)
+    parser.add_argument('inputs', nargs='+', help='files or directories to convert, - for stdin')
+    parser.add_argument('-d', '--direction', choices=list(DIRECTIONS), default=UNICODE_TO_LIMON)
+    parser.add_argument('-o', '--output', help='output file or directory, stdout for a single file by default')
+    parser.add_argument('-j', '--jobs', type=int, default=os.cpu_count() or 1, help='number of worker processes')
+    parser.add_argument('--include', default='*.txt', help='file name pattern to convert inside directories')
+    parser.add_argument('--encoding', default='utf-8', help='encoding of the input and output files')
+    parser.add_argument('--shard-size', type=int, default=4 * 1024 * 1024,
+                        help='files larger than this many bytes are split and converted in parallel')
+    parser.add_argument('-q', '--quiet', action='store_true', help='do not report the throughput')
+    args = parser.parse_args(argv)
+
+    try:
+        pairs = collect_files(args.inputs, args.output, args.include)
+    except ValueError as e:
+        parser.error(str(e))
+    start = time.perf_counter()
+    total = run(pairs, args.direction, args.encoding, args.jobs, args.shard_size)
+    elapsed = max(time.perf_counter() - start, 1e-9)
+    if not args.quiet:
+        megabytes = total / 1024 / 1024
+        print('kfc: %d files, %.2f MB in %.2fs, %.2f MB/s, %.1f files/s' % (
+            len(pairs), megabytes, elapsed, megabytes / elapsed, len(pairs) / elapsed), file=sys.stderr)
+    return 0
+
+
+class TestCli(unittest.TestCase):
+
+    UNICODE = u'ថ្ងៃខែឆ្នាំកំណើត ខ្ញុំ កញ្ច្រៀវ ស្ត្រី ប្រាំ, ប៉ៅ នុ៎ះ អ៊ុំ ម៉្ងៃ នំប៉័ង។\n' * 50
+
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+
+    def tearDown(self):
+        shutil.rmtree(self.directory)
+
+    def write(self, name, text):
+        path = os.path.join(self.directory, name)
+        _makedirs(path)
+        with open(path, 'w', encoding='utf-8') as f:
+            f.write(text)
+        return path
+
+    def read(self, name):
+        with open(os.path.join(self.directory, name), encoding='utf-8') as f:
+            return f.read()
+
+    def testShards(self):
+        path = self.write('big.txt', self.UNICODE)
+        shards = find_shards(path, UNICODE_TO_LIMON, 'utf-8', 1000)
+        self.assertGreater(len(shards), 1)
+        text = ''.join(_convert_shard(path, start, end, UNICODE_TO_LIMON, 'utf-8').decode('utf-8')
+                       for start, end in shards)
+        self.assertEqual(text, unicode_to_limon(self.UNICODE))
+
+    def testDirectory(self):
+        self.write('in/a.txt', self.UNICODE)
+        self.write('in/sub/b.txt', self.UNICODE[:100])
+        self.write('in/sub/c.bin', self.UNICODE)
+        for jobs in (1, 2):
+            out = os.path.join(self.directory, 'out%d' % jobs)
+            main([os.path.join(self.directory, 'in'), '-o', out, '-j', str(jobs), '--shard-size', '1000', '-q'])
+            self.assertEqual(self.read('out%d/a.txt' % jobs), unicode_to_limon(self.UNICODE))
+            self.assertEqual(self.read('out%d/sub/b.txt' % jobs), unicode_to_limon(self.UNICODE[:100]))
+            self.assertFalse(os.path.exists(os.path.join(out, 'sub', 'c.bin')))
+
+    def testRoundTrip(self):
+        source = self.write('a.txt', self.UNICODE)
+        limon = os.path.join(self.directory, 'limon.txt')
+        main([source, '-o', limon, '-j', '1', '-q'])
+        main([limon, '-o', os.path.join(self.directory, 'unicode.txt'), '-d', LIMON_TO_UNICODE, '-j', '2', '-q'])
+        self.assertEqual(self.read('unicode.txt'), self.UNICODE)
+
+    def testEmpty(self):
+        source = self.write('empty.txt', u'')
+        for jobs in (1, 2):
+            target = os.path.join(self.directory, 'empty%d.txt' % jobs)
+            main([source, '-o', target, '-j', str(jobs), '-q'])
+            self.assertEqual(self.read('empty%d.txt' % jobs), u'')
+        self.assertEqual(find_shards(source, UNICODE_TO_LIMON, 'utf-8', 0), [(0, 0)])
+        self.assertEqual(_convert_shard(source, 0, 0, UNICODE_TO_LIMON, 'utf-8'), b'')
+
+    def testNewlines(self):
+        text = self.UNICODE.replace('\n', '\r\n')
+        source = os.path.join(self.directory, 'crlf.txt')
+        with open(source, 'wb') as f:
+            f.write(text.encode('utf-8'))
+        expected = unicode_to_limon(text).encode('utf-8')
+        for jobs in (1, 2):
+            target = os.path.join(self.directory, 'out%d.txt' % jobs)
+            main([source, '-o', target, '-j', str(jobs), '--shard-size', '1000', '-q'])
+            with open(target, 'rb') as f:
+                self.assertEqual(f.read(), expected)
+
+
+if __name__ == '__main__':
+    sys.exit(main())
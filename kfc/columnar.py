@@ -0,0 +1,143 @@
+"""
+Conversion of pandas Series and Arrow string arrays, every distinct value is converted once.
+Importing this module registers the Series.kfc accessor when pandas is installed:
+
+    import kfc.columnar
+    df['province_limon'] = df['province'].kfc.to_limon()
+"""
+import unittest
+from .convert import UNICODE_TO_LIMON, LIMON_TO_UNICODE, get_converter
+
+try:
+    import pandas as pd
+except ImportError:
+    pd = None
+
+try:
+    import pyarrow as pa
+    import pyarrow.compute as pc
+except ImportError:
+    pa = None
+
+
+def convert_values(values, direction=UNICODE_TO_LIMON, **kwargs):
+    """
+    convert a list of distinct strings in one call of the converter when none of them holds a line feed,
+    a line feed always ends a cluster so the joined conversion splits back into the converted values
+    """
+    convert = get_converter(direction)
+    if values and not any('\n' in value for value in values):
+        converted = convert('\n'.join(values), **kwargs).split('\n')
+        if len(converted) == len(values):
+            return converted
+    return [convert(value, **kwargs) for value in values]
+
+
+def convert_array(array, direction=UNICODE_TO_LIMON, **kwargs):
+    """
+    convert a pyarrow string array or chunked array, nulls stay null
+    the column is dictionary encoded, the dictionary converted and the result taken from it by index
+    """
+    if pa is None:
+        raise ImportError('convert_array requires pyarrow')
+    get_converter(direction)
+    if isinstance(array, pa.ChunkedArray):
+        if array.num_chunks == 0:
+            return array
+        array = array.combine_chunks()
+    encoded = array if pa.types.is_dictionary(array.type) else pc.dictionary_encode(array)
+    dictionary = encoded.dictionary
+    converted = pa.array(convert_values(dictionary.to_pylist(), direction, **kwargs), type=dictionary.type)
+    if pa.types.is_dictionary(array.type):
+        return pa.DictionaryArray.from_arrays(encoded.indices, converted)
+    return converted.take(encoded.indices)
+
+
+def convert_series(series, direction=UNICODE_TO_LIMON, **kwargs):
+    """ convert a pandas Series of strings, missing values stay missing """
+    if pd is None:
+        raise ImportError('convert_series requires pandas')
+    get_converter(direction)
+    if isinstance(series.dtype, pd.CategoricalDtype):
+        categories = list(series.cat.categories)
+        converted = convert_values(categories, direction, **kwargs)
+        if len(set(converted)) == len(converted):
+            return series.cat.rename_categories(converted)
+        series = series.astype(object)
+    elif pa is not None and hasattr(series.array, '__arrow_array__'):
+        converted = convert_array(pa.chunked_array(pa.array(series.array)), direction, **kwargs)
+        return pd.Series(pd.array(converted, dtype=series.dtype), index=series.index, name=series.name)
+
+    codes, uniques = pd.factorize(series)
+    converted = pd.Index(convert_values(list(uniques), direction, **kwargs), dtype=object)
+    result = converted.take(codes, allow_fill=True, fill_value=None)
+    return pd.Series(result, index=series.index, name=series.name, dtype=series.dtype)
+
+
+if pd is not None:
+    @pd.api.extensions.register_series_accessor('kfc')
+    class KfcAccessor:
+        """ Series.kfc.to_limon() and Series.kfc.to_unicode() """
+
+        def __init__(self, series):
+            self._series = series
+
+        def to_limon(self, **kwargs):
+            return convert_series(self._series, UNICODE_TO_LIMON, **kwargs)
+
+        def to_unicode(self, **kwargs):
+            return convert_series(self._series, LIMON_TO_UNICODE, **kwargs)
+
+        def convert(self, direction, **kwargs):
+            return convert_series(self._series, direction, **kwargs)
+
+
+class TestColumnar(unittest.TestCase):
+
+    VALUES = [u'ភ្នំពេញ', u'សៀមរាប', None, u'ភ្នំពេញ', u'welcome, 100%', u'បាត់ដំបង', u'សៀមរាប']
+
+    def expected(self):
+        from .unicode_to_limon import unicode_to_limon
+        return [None if value is None else unicode_to_limon(value) for value in self.VALUES]
+
+    def testConvertValues(self):
+        from .limon_to_unicode import limon_to_unicode
+        values = [u'ខ្ញុំ', u'ស្ត្រី', u'a\nb', u'']
+        self.assertEqual(convert_values(values[:2]), [u'´', u'RsþI'])
+        limon = convert_values(values)
+        self.assertEqual(convert_values(limon, LIMON_TO_UNICODE), [limon_to_unicode(value) for value in limon])
+
+    @unittest.skipIf(pa is None, 'pyarrow is not installed')
+    def testArrow(self):
+        array = pa.array(self.VALUES)
+        self.assertEqual(convert_array(array).to_pylist(), self.expected())
+        chunked = pa.chunked_array([self.VALUES[:3], self.VALUES[3:]])
+        self.assertEqual(convert_array(chunked).to_pylist(), self.expected())
+        encoded = convert_array(array.dictionary_encode())
+        self.assertTrue(pa.types.is_dictionary(encoded.type))
+        self.assertEqual(encoded.to_pylist(), self.expected())
+
+    @unittest.skipIf(pa is not None, 'pyarrow is installed')
+    def testWithoutArrow(self):
+        with self.assertRaises(ImportError):
+            convert_array(self.VALUES)
+
+    @unittest.skipIf(pd is None, 'pandas is not installed')
+    def testSeries(self):
+        series = pd.Series(self.VALUES, index=range(10, 17), name='province')
+        converted = series.kfc.to_limon()
+        self.assertEqual(list(converted.index), list(series.index))
+        self.assertEqual(converted.name, 'province')
+        self.assertEqual([None if pd.isna(value) else value for value in converted], self.expected())
+        self.assertEqual(list(series.astype('category').kfc.to_limon().astype(object).where(series.notna(), None)),
+                         self.expected())
+        if pa is not None:
+            arrow = pd.Series(self.VALUES, dtype='string[pyarrow]')
+            self.assertEqual(arrow.kfc.to_limon().dtype, arrow.dtype)
+            self.assertEqual([None if pd.isna(value) else value for value in arrow.kfc.to_limon()], self.expected())
+        khmer = series.dropna()[series.dropna().str.contains(u'ក|ភ|ស|ប')]
+        self.assertEqual(list(khmer.kfc.to_limon().kfc.to_unicode()), list(khmer))
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,31 @@
+from .limon_to_unicode import limon_to_unicode, last_boundary as limon_boundary
+from .unicode_to_limon import unicode_to_limon
+from .utils.legacy_reorder import last_boundary as unicode_boundary
+
+
+UNICODE_TO_LIMON = 'unicode_to_limon'
+LIMON_TO_UNICODE = 'limon_to_unicode'
+
+# direction -> (conversion function, function returning the last index the text can be cut at)
+DIRECTIONS = {
+    UNICODE_TO_LIMON: (unicode_to_limon, unicode_boundary),
+    LIMON_TO_UNICODE: (limon_to_unicode, limon_boundary),
+}
+
+
+def get_direction(direction):
+    """ return the (converter, boundary) pair of a direction """
+    try:
+        return DIRECTIONS[direction]
+    except KeyError:
+        raise ValueError('unknown direction ' + repr(direction) + ', expected one of ' + ', '.join(DIRECTIONS))
+
+
+def get_converter(direction):
+    """ return the conversion function of a direction """
+    return get_direction(direction)[0]
+
+
+def convert(text, direction=UNICODE_TO_LIMON, **kwargs):
+    """ convert text in the given direction """
+    return get_converter(direction)(text, **kwargs)
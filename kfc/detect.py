@@ -0,0 +1,229 @@
+"""
+Detection of the limon encoded spans of text mixing them with Latin script languages such as English.
+Every word is scored in a single pass over a table of character bigram log likelihood ratios, limon against English.
+The limon statistics are derived from the glyph tables of the font: syllables drawn from its consonants, coengs,
+vowels and signs are rendered by the unicode_to_limon pipeline. The English ones are shipped in fonts/latin.json,
+the bigram counts of the English prose of the README and of the docstrings of kfc counted by bigram_counts.
+"""
+import array
+import json
+import math
+import os
+import random
+import re
+import threading
+import unittest
+from .engine import get_engine
+from .fonts import DEFAULT_FONT, FONTS_DIR, Font, get_font
+from .utils import legacy_reorder
+
+
+LATIN_TABLE = os.path.join(FONTS_DIR, 'latin.json')
+
+# starts and ends every word in the bigrams
+BOUNDARY = ' '
+# index of the characters of neither table
+_OTHER = 1
+
+_words = re.compile(r'\S+')
+_digits = '0123456789'
+
+
+def bigram_counts(texts):
+    """ the number of every character bigram in the words of texts, each word between two BOUNDARY """
+    counts = {}
+    for text in texts:
+        for word in text.split():
+            word = BOUNDARY + word + BOUNDARY
+            for i in range(len(word) - 1):
+                pair = word[i:i + 2]
+                counts[pair] = counts.get(pair, 0) + 1
+    return counts
+
+
+def _syllables(font, count, seed=0):
+    """ limon words of random syllables made of the characters of the glyph table of font """
+    consonants, coengs, vowels, signs, punctuations = [], [], [], [], []
+    for text in font.glyphs.table:
+        kChar = legacy_reorder._charClasses.get(text[0], legacy_reorder._xx)
+        if (len(text) == 2) and (text[0] == legacy_reorder.COENG):
+            coengs.append(text)
+        elif (len(text) > 1) or (text == legacy_reorder.MARK):
+            continue
+        elif (kChar & legacy_reorder.CF_CONSONANT):
+            consonants.append(text)
+        elif ((kChar & legacy_reorder.CF_CLASS_MASK) == legacy_reorder.CC_DEPENDENT_VOWEL):
+            vowels.append(text)
+        elif (kChar in (legacy_reorder._sa, legacy_reorder._sp, legacy_reorder._cs)):
+            signs.append(text)
+        elif (kChar == legacy_reorder._xx) and ('ក' <= text <= '᧿'):
+            punctuations.append(text)
+    rnd = random.Random(seed)
+    words = []
+    for _ in range(count):
+        word = ''
+        for _ in range(rnd.randint(1, 6)):
+            word += rnd.choice(consonants)
+            if coengs and rnd.random() < 0.3:
+                word += rnd.choice(coengs)
+            if rnd.random() < 0.6:
+                word += rnd.choice(vowels)
+            if rnd.random() < 0.2:
+                word += rnd.choice(signs)
+        if punctuations and rnd.random() < 0.1:
+            word += rnd.choice(punctuations)
+        words.append(word)
+    return get_engine(font).unicode_to_limon(' '.join(words))
+
+
+class Detector:
+    """
+    Character bigram log likelihood ratios of limon against Latin script text, positive scores are limon.
+    The table is a flat array indexed by the two characters, every digit counts as 0.
+    """
+
+    __slots__ = ('_index', '_size', '_scores')
+
+    def __init__(self, limon_counts, latin_counts, smoothing=0.5):
+        chars = set(char for counts in (limon_counts, latin_counts) for pair in counts for char in pair)
+        chars.difference_update(BOUNDARY + _digits[1:])
+        index = {BOUNDARY: 0}
+        for char in sorted(chars):
+            index[char] = len(index) + 1
+        for digit in _digits:
+            index[digit] = index.get('0', _OTHER)
+        size = len(chars) + 2
+
+        def probabilities(counts):
+            table = [0.0] * (size * size)
+            for (first, second), count in counts.items():
+                table[index[first] * size + index[second]] += count
+            for row in range(size):
+                total = sum(table[row * size:(row + 1) * size]) + smoothing * size
+                for column in range(size):
+                    table[row * size + column] = math.log((table[row * size + column] + smoothing) / total)
+            return table
+
+        limon = probabilities(limon_counts)
+        latin = probabilities(latin_counts)
+        self._index = index
+        self._size = size
+        self._scores = array.array('f', (a - b for a, b in zip(limon, latin)))
+
+    def score(self, word):
+        """ log likelihood ratio of word, without white space, being limon rather than Latin script text """
+        index = self._index
+        scores = self._scores
+        size = self._size
+        previous = 0
+        total = 0.0
+        for char in word:
+            current = index.get(char, _OTHER)
+            total += scores[previous * size + current]
+            previous = current
+        return total + scores[previous * size]
+
+    def spans(self, text, threshold=0.0, switch=8.0, margin=12.0):
+        """
+        return the (start, end) offsets of the limon spans of text, runs of words scoring above threshold
+        every change between limon and Latin costs switch, so a short or ambiguous word, such as a single glyph or a
+        Khmer name spelled in Latin, takes the class of the words around it
+        a span whose words score less than margin in total, such as an identifier or a lone short word, is Latin
+        """
+        words = [(match.start(), match.end(), self.score(match.group()) - threshold)
+                 for match in _words.finditer(text)]
+        # the cost of the best classes of the words so far, the last one Latin or limon, and where each came from
+        latin = limon = 0.0
+        came = []
+        for _, _, score in words:
+            latinFromLimon = limon + switch < latin
+            limonFromLatin = latin + switch < limon
+            came.append((latinFromLimon, limonFromLatin))
+            latin, limon = min(latin, limon + switch) + score, min(limon, latin + switch) - score
+        # (start, end, total score) of the limon spans, last first
+        spans = []
+        isLimon = limon < latin
+        for (start, end, score), (latinFromLimon, limonFromLatin) in zip(reversed(words), reversed(came)):
+            if isLimon:
+                if spans and not text[end:spans[-1][0]].strip():
+                    spans[-1] = (start, spans[-1][1], spans[-1][2] + score)
+                else:
+                    spans.append((start, end, score))
+                isLimon = not limonFromLatin
+            else:
+                isLimon = latinFromLimon
+        spans.reverse()
+        return [(start, end) for start, end, score in spans if score >= margin]
+
+    def is_limon(self, text, threshold=0.0):
+        """ whether text as a whole reads as limon """
+        return sum(self.score(word) for word in text.split()) > threshold
+
+
+# Font -> Detector, only ever added to
+_detectors = {}
+_lock = threading.Lock()
+_latin = None
+
+
+def get_detector(font=DEFAULT_FONT):
+    """ return the Detector of a font name or Font, built the first time it is asked for """
+    global _latin
+    if not isinstance(font, Font):
+        font = get_font(font)
+    detector = _detectors.get(font)
+    if detector is None:
+        with _lock:
+            detector = _detectors.get(font)
+            if detector is None:
+                if _latin is None:
+                    with open(LATIN_TABLE, encoding='utf-8') as f:
+                        _latin = json.load(f)['bigrams']
+                detector = _detectors[font] = Detector(bigram_counts([_syllables(font, 20000)]), _latin)
+    return detector
+
+
+def limon_spans(text, font=DEFAULT_FONT, threshold=0.0):
+    """ return the (start, end) offsets of the limon spans of text """
+    return get_detector(font).spans(text, threshold)
+
+
+class TestDetect(unittest.TestCase):
+
+    UNICODE = u'ថ្ងៃខែឆ្នាំកំណើត ខ្ញុំ កញ្ច្រៀវ ស្ត្រី ប្រាំ, ប៉ៅ នុ៎ះ អ៊ុំ ម៉្ងៃ នំប៉័ង។'
+    ENGLISH = u'The report was published on Monday, see https://example.com for the details.'
+
+    def testScore(self):
+        from .unicode_to_limon import unicode_to_limon
+        detector = get_detector()
+        self.assertIs(get_detector(get_font()), detector)
+        for word in unicode_to_limon(self.UNICODE).split():
+            if len(word) > 3:
+                self.assertGreater(detector.score(word), 0, word)
+        for word in self.ENGLISH.split():
+            if len(word) > 3:
+                self.assertLess(detector.score(word), 0, word)
+        self.assertTrue(detector.is_limon(unicode_to_limon(self.UNICODE)))
+        self.assertFalse(detector.is_limon(self.ENGLISH))
+
+    def testSpans(self):
+        from .unicode_to_limon import unicode_to_limon
+        limon = unicode_to_limon(self.UNICODE)
+        # Penh and the single glyph of ខ្ញុំ are ambiguous alone
+        english = u'The report was published in Phnom Penh on Monday.'
+        text = english + u' ' + limon + u'\n' + self.ENGLISH
+        start = len(english) + 1
+        self.assertEqual(limon_spans(text), [(start, start + len(limon))])
+        self.assertEqual(limon_spans(limon), [(0, len(limon))])
+        self.assertEqual(limon_spans(self.ENGLISH), [])
+        self.assertEqual(limon_spans(u''), [])
+        # identifiers are not evidence enough on their own
+        self.assertEqual(limon_spans(u'ID: x7Kq9 zzz'), [])
+        self.assertEqual(limon_spans(u'Wi-Fi pwd: Kx9!zQ'), [])
+
+    def testCounts(self):
+        self.assertEqual(bigram_counts([u'ab a', u'b']), {' a': 2, 'ab': 1, 'b ': 2, 'a ': 1, ' b': 1})
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,584 @@
+"""
+Convert the legacy encoded text of DOCX and ODT documents.
+Only the text set in a font of the font map is converted and the font is renamed to its target.
+The XML members are streamed through a SAX parser, the other members are copied without recompression.
+"""
+import io
+import re
+import struct
+import unittest
+import zipfile
+import xml.sax
+from xml.sax.saxutils import XMLGenerator
+from xml.etree.ElementTree import iterparse
+from xml.sax.xmlreader import AttributesImpl
+from .convert import UNICODE_TO_LIMON, LIMON_TO_UNICODE, get_converter
+
+
+# legacy font -> unicode font it is converted to
+LIMON_FONTS = {
+    'Limon S1': 'Khmer OS',
+    'Limon S2': 'Khmer OS',
+    'Limon S3': 'Khmer OS',
+    'Limon S4': 'Khmer OS',
+    'Limon S5': 'Khmer OS',
+    'Limon R1': 'Khmer OS',
+    'Limon R2': 'Khmer OS',
+    'Limon R3': 'Khmer OS',
+    'Limon R4': 'Khmer OS',
+    'Limon R5': 'Khmer OS',
+    'Limon F1': 'Khmer OS Muol Light',
+    'Limon F2': 'Khmer OS Muol Light',
+    'Limon F3': 'Khmer OS Muol Light',
+    'Limon F4': 'Khmer OS Muol Light',
+    'Limon F5': 'Khmer OS Muol Light',
+}
+
+# unicode font -> legacy font it is converted to
+UNICODE_FONTS = {
+    'Khmer OS': 'Limon S1',
+    'Khmer OS System': 'Limon S1',
+    'Khmer OS Content': 'Limon S1',
+    'Khmer OS Siemreap': 'Limon S1',
+    'Khmer OS Battambang': 'Limon S1',
+    'Khmer OS Muol': 'Limon F1',
+    'Khmer OS Muol Light': 'Limon F1',
+}
+
+DEFAULT_FONT_MAPS = {
+    LIMON_TO_UNICODE: LIMON_FONTS,
+    UNICODE_TO_LIMON: UNICODE_FONTS,
+}
+
+# docx members holding text
+_DOCX_TEXT = re.compile(r'word/(document|header\d*|footer\d*|footnotes|endnotes|comments)\.xml$')
+_DOCX_FONT_SLOTS = ('w:ascii', 'w:hAnsi', 'w:cs', 'w:eastAsia')
+# direction -> the w:rFonts slots Word draws its source text with, legacy text is 8-bit and Khmer unicode complex
+_DOCX_TEXT_SLOTS = {
+    LIMON_TO_UNICODE: ('w:ascii', 'w:hAnsi'),
+    UNICODE_TO_LIMON: ('w:cs',),
+}
+
+_ODT_FONT_ATTRIBUTES = ('style:font-name', 'style:font-name-complex', 'style:font-name-asian', 'fo:font-family',
+                        'style:font-family-complex', 'style:font-family-asian', 'svg:font-family')
+_ODT_TEXT = ('content.xml', 'styles.xml')
+
+
+def _unquote(name):
+    return name.strip().strip('\'"')
+
+
+class _Rewriter(xml.sax.handler.ContentHandler):
+    """ copies a xml document, converting the text for which convert_text() is true """
+
+    def __init__(self, out, convert, font_map):
+        super().__init__()
+        self.out = XMLGenerator(out, encoding='utf-8', short_empty_elements=True)
+        self.convert = convert
+        self.font_map = font_map
+        self.converted = 0
+        self._text = []
+
+    def _flush(self):
+        if self._text:
+            text = ''.join(self._text)
+            self._text = []
+            if self.convert_text() and text.strip():
+                text = self.convert(text)
+                self.converted += 1
+            self.out.characters(text)
+
+    def convert_text(self):
+        return False
+
+    def rename(self, value):
+        target = self.font_map.get(_unquote(value))
+        if target is None:
+            return value
+        return value.replace(_unquote(value), target)
+
+    def startDocument(self):
+        self.out.startDocument()
+
+    def endDocument(self):
+        self._flush()
+        self.out.endDocument()
+
+    def startElement(self, name, attrs):
+        self._flush()
+        self.out.startElement(name, self.start(name, attrs))
+
+    def endElement(self, name):
+        self._flush()
+        self.end(name)
+        self.out.endElement(name)
+
+    def characters(self, content):
+        self._text.append(content)
+
+    def ignorableWhitespace(self, whitespace):
+        self._text.append(whitespace)
+
+    def processingInstruction(self, target, data):
+        self._flush()
+        self.out.processingInstruction(target, data)
+
+    def start(self, name, attrs):
+        return attrs
+
+    def end(self, name):
+        pass
+
+
+class _DocxRewriter(_Rewriter):
+    """ w:t text of the runs set in a mapped font, directly or through a paragraph or character style """
+
+    def __init__(self, out, convert, font_map, style_fonts, default_fonts, direction):
+        super().__init__(out, convert, font_map)
+        self.style_fonts = style_fonts
+        self.default_fonts = default_fonts
+        self.direction = direction
+        self.stack = []
+        # slot -> font of every level of formatting
+        self.paragraph_fonts = {}
+        self.run_fonts = {}
+        self.run_style_fonts = {}
+        self.in_text = False
+
+    def font(self):
+        levels = (self.run_fonts, self.run_style_fonts, self.paragraph_fonts, self.default_fonts)
+        return _docx_font(levels, _DOCX_TEXT_SLOTS[self.direction], self.font_map)
+
+    def convert_text(self):
+        return self.in_text and self.font() in self.font_map
+
+    def start(self, name, attrs):
+        parent = self.stack[-1] if self.stack else None
+        self.stack.append(name)
+        if name == 'w:p':
+            self.paragraph_fonts = {}
+        elif name == 'w:r':
+            self.run_fonts = self.run_style_fonts = {}
+        elif name == 'w:t':
+            self.in_text = 'w:r' in self.stack
+        elif name == 'w:pStyle':
+            self.paragraph_fonts = self.style_fonts.get(attrs.get('w:val'), {})
+        elif name == 'w:rStyle' and 'w:r' in self.stack:
+            self.run_style_fonts = self.style_fonts.get(attrs.get('w:val'), {})
+        elif name == 'w:rFonts':
+            fonts = _docx_fonts(attrs)
+            if parent == 'w:rPr' and len(self.stack) > 2 and self.stack[-3] == 'w:r':
+                # the slots the run leaves out come from its styles and the defaults
+                self.run_fonts = fonts
+                font = self.font()
+            else:
+                font = _docx_font((fonts,), _DOCX_FONT_SLOTS, self.font_map)
+            if font in self.font_map:
+                attrs = _docx_rename(attrs, self.font_map[font], self.font_map, self.direction)
+        return attrs
+
+    def end(self, name):
+        self.stack.pop()
+        if name == 'w:t':
+            self.in_text = False
+
+
+def _docx_fonts(attrs):
+    """ the slot -> font of a w:rFonts element """
+    return dict((slot, attrs.get(slot)) for slot in _DOCX_FONT_SLOTS if attrs.get(slot))
+
+
+def _docx_font(levels, slots, font_map):
+    """
+    the font of text drawn with slots, every slot taken from the first of the levels of formatting that sets it,
+    preferring one of the font map
+    """
+    fonts = []
+    for slot in slots:
+        for fonts_of_level in levels:
+            if slot in fonts_of_level:
+                fonts.append(fonts_of_level[slot])
+                break
+    for font in fonts:
+        if font in font_map:
+            return font
+    return fonts[0] if fonts else None
+
+
+def _docx_rename(attrs, target, font_map, direction):
+    values = dict(attrs.items())
+    for slot in _DOCX_FONT_SLOTS:
+        if values.get(slot) in font_map:
+            values[slot] = font_map[values[slot]]
+    # converted text is drawn with the slots of the other direction, khmer unicode with the complex script font
+    if direction == LIMON_TO_UNICODE:
+        values['w:cs'] = target
+        values['w:hint'] = 'cs'
+    else:
+        values['w:ascii'] = values['w:hAnsi'] = target
+        if values.get('w:hint') == 'cs':
+            del values['w:hint']
+    return AttributesImpl(values)
+
+
+def _docx_styles(data):
+    """ read word/styles.xml, return the slot -> font of every style id and of the defaults """
+    parents = {}
+    fonts = {}
+    default = {}
+    style = None
+    in_defaults = False
+    for event, element in _iterparse(data, ('start', 'end')):
+        tag = _local(element.tag)
+        if event == 'start':
+            if tag == 'style':
+                style = _attribute(element, 'styleId')
+            elif tag == 'docDefaults':
+                in_defaults = True
+            continue
+        if tag == 'basedOn' and style is not None:
+            parents[style] = _attribute(element, 'val')
+        elif tag == 'rFonts':
+            attrs = dict((_qualified(key), value) for key, value in element.attrib.items())
+            if in_defaults:
+                default = _docx_fonts(attrs)
+            elif style is not None:
+                fonts[style] = _docx_fonts(attrs)
+        elif tag == 'style':
+            style = None
+            element.clear()
+        elif tag == 'docDefaults':
+            in_defaults = False
+    return _inherit_slots(fonts, parents), default
+
+
+class _OdtRewriter(_Rewriter):
+    """ text inside elements whose style, or the style of an ancestor, uses a mapped font """
+
+    TEXT_ELEMENTS = ('text:p', 'text:h', 'text:span', 'text:a', 'text:list-item', 'text:note-body')
+
+    def __init__(self, out, convert, font_map, style_fonts):
+        super().__init__(out, convert, font_map)
+        self.style_fonts = style_fonts
+        self.fonts = [None]
+        self.in_body = False
+
+    def convert_text(self):
+        return self.in_body and self.fonts[-1] in self.font_map
+
+    def start(self, name, attrs):
+        if name in ('office:body', 'office:master-styles'):
+            self.in_body = True
+        font = self.fonts[-1]
+        if 'text:style-name' in attrs:
+            font = self.style_fonts.get(attrs['text:style-name'], font)
+        self.fonts.append(font)
+        if any(key in attrs for key in _ODT_FONT_ATTRIBUTES) or name == 'style:font-face':
+            values = dict(attrs.items())
+            matched = None
+            for key in _ODT_FONT_ATTRIBUTES + ('style:name',):
+                if key in values and (key != 'style:name' or name == 'style:font-face'):
+                    if _unquote(values[key]) in self.font_map:
+                        matched = self.font_map[_unquote(values[key])]
+                        values[key] = self.rename(values[key])
+            if matched is not None and name == 'style:text-properties':
+                # converted text is drawn with the western font
+                values['style:font-name'] = matched
+            attrs = AttributesImpl(values)
+        return attrs
+
+    def end(self, name):
+        self.fonts.pop()
+        if name in ('office:body', 'office:master-styles'):
+            self.in_body = False
+
+
+def _odt_styles(members, font_map):
+    """ read the styles of styles.xml and content.xml, return the font family of every style name """
+    faces = {}
+    parents = {}
+    fonts = {}
+    for data in members:
+        style = None
+        for event, element in _iterparse(data, ('start', 'end')):
+            tag = _local(element.tag)
+            if event == 'start':
+                if tag == 'style':
+                    style = _attribute(element, 'name')
+                    parent = _attribute(element, 'parent-style-name')
+                    if parent:
+                        parents[style] = parent
+                continue
+            if tag == 'font-face':
+                faces[_attribute(element, 'name')] = _unquote(_attribute(element, 'font-family') or
+                                                              _attribute(element, 'name'))
+            elif tag == 'text-properties' and style is not None:
+                names = [_attribute(element, key) for key in ('font-name', 'font-name-complex', 'font-name-asian')]
+                names = [faces.get(name, name) for name in names if name]
+                names += [_unquote(value) for value in (_attribute(element, 'font-family'),) if value]
+                for font in names:
+                    if font in font_map:
+                        fonts[style] = font
+                        break
+                else:
+                    if names:
+                        fonts[style] = names[0]
+            elif tag == 'style':
+                style = None
+            elif tag == 'body':
+                break
+            element.clear()
+    return _inherit(fonts, parents)
+
+
+def _inherit(fonts, parents):
+    """ give every style the font of its closest ancestor that sets one """
+    resolved = {}
+    for style in set(fonts) | set(parents):
+        seen = set()
+        current = style
+        while current is not None and current not in fonts and current not in seen:
+            seen.add(current)
+            current = parents.get(current)
+        if current in fonts:
+            resolved[style] = fonts[current]
+    return resolved
+
+
+def _inherit_slots(fonts, parents):
+    """ give every style the slots it leaves out from its closest ancestor that sets them """
+    resolved = {}
+    for style in set(fonts) | set(parents):
+        merged = {}
+        seen = set()
+        current = style
+        while current is not None and current not in seen:
+            seen.add(current)
+            for slot, font in fonts.get(current, {}).items():
+                merged.setdefault(slot, font)
+            current = parents.get(current)
+        resolved[style] = merged
+    return resolved
+
+
+def _iterparse(data, events):
+    return iterparse(io.BytesIO(data) if isinstance(data, bytes) else data, events)
+
+
+def _local(tag):
+    return tag.rsplit('}', 1)[-1]
+
+
+def _attribute(element, name):
+    for key, value in element.attrib.items():
+        if _local(key) == name:
+            return value
+    return None
+
+
+_PREFIXES = {
+    'http://schemas.openxmlformats.org/wordprocessingml/2006/main': 'w',
+}
+
+
+def _qualified(key):
+    if key.startswith('{'):
+        namespace, name = key[1:].split('}', 1)
+        return _PREFIXES.get(namespace, namespace) + ':' + name
+    return key
+
+
+def _copy_raw(source, target, info):
+    """ append a member to target with its compressed bytes, without decompressing it """
+    source.fp.seek(info.header_offset)
+    header = source.fp.read(zipfile.sizeFileHeader)
+    name_length, extra_length = struct.unpack('<HH', header[26:30])
+    source.fp.seek(info.header_offset + zipfile.sizeFileHeader + name_length + extra_length)
+    data = source.fp.read(info.compress_size)
+
+    copy = zipfile.ZipInfo(info.filename, info.date_time)
+    copy.compress_type = info.compress_type
+    copy.external_attr = info.external_attr
+    copy.create_system = info.create_system
+    copy.flag_bits = info.flag_bits & ~0x08     # sizes are written in the local header, no data descriptor
+    copy.CRC = info.CRC
+    copy.compress_size = info.compress_size
+    copy.file_size = info.file_size
+    copy.header_offset = target.fp.tell()
+    target.fp.write(copy.FileHeader())
+    target.fp.write(data)
+    target.filelist.append(copy)
+    target.NameToInfo[copy.filename] = copy
+    target.start_dir = target.fp.tell()
+
+
+def _rewrite(source, target, info, handler_factory):
+    out_info = zipfile.ZipInfo(info.filename, info.date_time)
+    out_info.compress_type = info.compress_type
+    out_info.external_attr = info.external_attr
+    # converted text may take up to three times the space in UTF-8
+    force_zip64 = info.file_size * 3 > zipfile.ZIP64_LIMIT
+    with source.open(info) as reader, target.open(out_info, 'w', force_zip64=force_zip64) as writer:
+        handler = handler_factory(writer)
+        parser = xml.sax.make_parser()
+        parser.setContentHandler(handler)
+        parser.parse(reader)
+    return handler.converted
+
+
+def document_format(archive):
+    """ 'docx' or 'odt' from the members of an opened zip archive """
+    names = set(archive.namelist())
+    if 'word/document.xml' in names:
+        return 'docx'
+    if 'content.xml' in names and 'mimetype' in names:
+        return 'odt'
+    raise ValueError('not a DOCX or ODT document')
+
+
+def convert_document(source, target, direction=LIMON_TO_UNICODE, font_map=None):
+    """
+    Convert the text of a DOCX or ODT document set in one of the fonts of font_map, and rename those fonts.
+    font_map maps a source font name to the name of the font to use after conversion, it defaults to
+    DEFAULT_FONT_MAPS[direction]. source and target are paths or binary file objects.
+    Return the number of converted text segments.
+    """
+    convert = get_converter(direction)
+    if font_map is None:
+        font_map = DEFAULT_FONT_MAPS[direction]
+    converted = 0
+    with zipfile.ZipFile(source) as archive, zipfile.ZipFile(target, 'w') as output:
+        kind = document_format(archive)
+        names = set(archive.namelist())
+        if kind == 'docx':
+            styles = archive.read('word/styles.xml') if 'word/styles.xml' in names else b'<styles/>'
+            style_fonts, default_fonts = _docx_styles(styles)
+
+            def factory(writer):
+                return _DocxRewriter(writer, convert, font_map, style_fonts, default_fonts, direction)
+
+            def is_text(name):
+                return bool(_DOCX_TEXT.match(name)) or name == 'word/styles.xml'
+        else:
+            style_fonts = _odt_styles([archive.read(name) for name in _ODT_TEXT if name in names], font_map)
+
+            def factory(writer):
+                return _OdtRewriter(writer, convert, font_map, style_fonts)
+
+            def is_text(name):
+                return name in _ODT_TEXT
+
+        for info in archive.infolist():
+            if is_text(info.filename):
+                converted += _rewrite(archive, output, info, factory)
+            else:
+                _copy_raw(archive, output, info)
+    return converted
+
+
+class TestDocument(unittest.TestCase):
+
+    DOCX = (
+        '<?xml version="1.0" encoding="UTF-8" standalone="yes"?>'
+        '<w:document xmlns:w="http://schemas.openxmlformats.org/wordprocessingml/2006/main"><w:body>'
+        '<w:p><w:r><w:rPr><w:rFonts w:ascii="Limon S1" w:hAnsi="Limon S1"/></w:rPr><w:t>éf¶ExqñaMkMeNIt</w:t></w:r>'
+        '<w:r><w:rPr><w:rFonts w:ascii="Arial"/></w:rPr><w:t xml:space="preserve"> welcome &amp; </w:t></w:r>'
+        '<w:r><w:rPr><w:rStyle w:val="Legacy"/></w:rPr><w:t>´</w:t></w:r></w:p>'
+        '</w:body></w:document>'
+    )
+    STYLES = (
+        '<?xml version="1.0" encoding="UTF-8"?>'
+        '<w:styles xmlns:w="http://schemas.openxmlformats.org/wordprocessingml/2006/main">'
+        '<w:docDefaults><w:rPrDefault><w:rPr><w:rFonts w:ascii="Arial"/></w:rPr></w:rPrDefault></w:docDefaults>'
+        '<w:style w:styleId="Base"><w:rPr><w:rFonts w:ascii="Limon R1"/></w:rPr></w:style>'
+        '<w:style w:styleId="Legacy"><w:basedOn w:val="Base"/></w:style>'
+        '</w:styles>'
+    )
+    CONTENT = (
+        '<?xml version="1.0" encoding="UTF-8"?>'
+        '<office:document-content xmlns:office="urn:oasis:names:tc:opendocument:xmlns:office:1.0" '
+        'xmlns:style="urn:oasis:names:tc:opendocument:xmlns:style:1.0" '
+        'xmlns:text="urn:oasis:names:tc:opendocument:xmlns:text:1.0" '
+        'xmlns:svg="urn:oasis:names:tc:opendocument:xmlns:svg-compatible:1.0">'
+        '<office:font-face-decls><style:font-face style:name="Limon S1" svg:font-family="\'Limon S1\'"/>'
+        '</office:font-face-decls>'
+        '<office:automatic-styles><style:style style:name="T1" style:family="text">'
+        '<style:text-properties style:font-name="Limon S1"/></style:style></office:automatic-styles>'
+        '<office:body><office:text><text:p>welcome <text:span text:style-name="T1">éf¶ExqñaMkMeNIt</text:span>'
+        '</text:p></office:text></office:body></office:document-content>'
+    )
+
+    def build(self, members):
+        data = io.BytesIO()
+        with zipfile.ZipFile(data, 'w') as archive:
+            for name, text in members:
+                archive.writestr(name, text, compress_type=zipfile.ZIP_STORED if name == 'mimetype' else
+                                 zipfile.ZIP_DEFLATED)
+        return data
+
+    def convert(self, members):
+        target = io.BytesIO()
+        count = convert_document(self.build(members), target)
+        return count, zipfile.ZipFile(target)
+
+    def testDocx(self):
+        count, archive = self.convert([('word/document.xml', self.DOCX), ('word/styles.xml', self.STYLES),
+                                       ('word/media/image.png', b'\x89PNG' * 100)])
+        self.assertEqual(count, 2)
+        document = archive.read('word/document.xml').decode('utf-8')
+        self.assertIn(u'<w:t>ថ្ងៃខែឆ្នាំកំណើត</w:t>', document)
+        self.assertIn(u'<w:t xml:space="preserve"> welcome &amp; </w:t>', document)
+        self.assertIn(u'<w:t>ខ្ញុំ</w:t>', document)
+        self.assertIn(u'w:ascii="Khmer OS"', document)
+        self.assertIn(u'w:ascii="Arial"', document)
+        self.assertIn(u'w:ascii="Khmer OS"', archive.read('word/styles.xml').decode('utf-8'))
+        self.assertEqual(archive.read('word/media/image.png'), b'\x89PNG' * 100)
+        self.assertIsNone(archive.testzip())
+
+    def testDocxSlots(self):
+        document = (
+            '<?xml version="1.0" encoding="UTF-8" standalone="yes"?>'
+            '<w:document xmlns:w="http://schemas.openxmlformats.org/wordprocessingml/2006/main"><w:body>'
+            '<w:p><w:r><w:rPr><w:rFonts w:ascii="Limon S1" w:hAnsi="Limon S1" w:cs="Arial"/></w:rPr>'
+            '<w:t>´</w:t></w:r></w:p>'
+            '<w:p><w:pPr><w:pStyle w:val="Base"/></w:pPr><w:r><w:rPr><w:rFonts w:cs="Arial"/></w:rPr>'
+            '<w:t>RsþI</w:t></w:r></w:p>'
+            '</w:body></w:document>'
+        )
+        count, archive = self.convert([('word/document.xml', document), ('word/styles.xml', self.STYLES)])
+        self.assertEqual(count, 2)
+        document = archive.read('word/document.xml').decode('utf-8')
+        # khmer unicode is drawn with the complex script font
+        self.assertIn(u'<w:rFonts w:ascii="Khmer OS" w:hAnsi="Khmer OS" w:cs="Khmer OS" w:hint="cs"/>', document)
+        self.assertIn(u'<w:t>ខ្ញុំ</w:t>', document)
+        # the ascii font of the run comes from the paragraph style
+        self.assertIn(u'<w:rFonts w:cs="Khmer OS" w:hint="cs"/>', document)
+        self.assertIn(u'<w:t>ស្ត្រី</w:t>', document)
+        self.assertNotIn(u'Arial"/><w:t>', document)
+
+    def testOdt(self):
+        count, archive = self.convert([('mimetype', 'application/vnd.oasis.opendocument.text'),
+                                       ('content.xml', self.CONTENT)])
+        self.assertEqual(count, 1)
+        self.assertEqual(archive.infolist()[0].filename, 'mimetype')
+        content = archive.read('content.xml').decode('utf-8')
+        self.assertIn(u'<text:p>welcome <text:span text:style-name="T1">ថ្ងៃខែឆ្នាំកំណើត</text:span>', content)
+        self.assertIn(u'style:font-name="Khmer OS"', content)
+        self.assertIn(u'svg:font-family="\'Khmer OS\'"', content)
+        self.assertIsNone(archive.testzip())
+
+    def testRoundTrip(self):
+        count, archive = self.convert([('word/document.xml', self.DOCX), ('word/styles.xml', self.STYLES)])
+        data = io.BytesIO()
+        with zipfile.ZipFile(data, 'w') as output:
+            for info in archive.infolist():
+                output.writestr(info, archive.read(info))
+        target = io.BytesIO()
+        self.assertEqual(convert_document(data, target, UNICODE_TO_LIMON), 2)
+        document = zipfile.ZipFile(target).read('word/document.xml').decode('utf-8')
+        self.assertIn(u'<w:t>éf¶ExqñaMkMeNIt</w:t>', document)
+        self.assertIn(u'w:ascii="Limon S1"', document)
+
+
+if __name__ == '__main__':
+    unittest.main()
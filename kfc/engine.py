@@ -0,0 +1,95 @@
+"""
+Conversion engines, the compiled font and reorder function behind unicode_to_limon and limon_to_unicode.
+An Engine cannot be changed once built and keeps no state between calls, so one engine can be shared by any number
+of threads. The only cache below it, the rendered clusters of legacy_reorder.reorder, is kept per thread.
+"""
+import threading
+import unittest
+from . import backend
+from .fonts import DEFAULT_FONT, Font, get_font
+from .utils import legacy_reorder
+from .utils.normalization import normalize_reorder
+
+
+class Engine:
+    """ converts text with one font and one reorder function """
+
+    __slots__ = ('font', 'reorder', '_pre_reorder', '_glyphs', '_decoder')
+
+    def __init__(self, font=DEFAULT_FONT, reorder=None):
+        font = font if isinstance(font, Font) else get_font(font)
+        object.__setattr__(self, 'font', font)
+        object.__setattr__(self, 'reorder', backend.reorder if reorder is None else reorder)
+        object.__setattr__(self, '_pre_reorder', font.pre_reorder.translate)
+        object.__setattr__(self, '_glyphs', font.glyphs.translate)
+        object.__setattr__(self, '_decoder', font.decoder.translate)
+
+    def __setattr__(self, name, value):
+        raise AttributeError('Engine is immutable')
+
+    def __delattr__(self, name):
+        raise AttributeError('Engine is immutable')
+
+    def unicode_to_limon(self, text, normalize=False):
+        """ with normalize, every cluster is put in canonical form in the same pass as it is reordered """
+        if normalize:
+            return self._glyphs(normalize_reorder(text, self._pre_reorder))
+        return self._glyphs(self.reorder(self._pre_reorder(text)))
+
+    def limon_to_unicode(self, text):
+        return legacy_reorder.inverse_reorder(self._decoder(text))
+
+    def __repr__(self):
+        return 'Engine(%r, %s)' % (self.font.name, getattr(self.reorder, '__module__', self.reorder))
+
+
+# (font, reorder function) -> Engine, only ever added to
+_engines = {}
+_lock = threading.Lock()
+
+
+def get_engine(font=DEFAULT_FONT):
+    """ return the shared Engine of a font name or Font for the current backend """
+    if not isinstance(font, Font):
+        font = get_font(font)
+    key = (font, backend.reorder)
+    engine = _engines.get(key)
+    if engine is None:
+        with _lock:
+            engine = _engines.get(key)
+            if engine is None:
+                engine = _engines[key] = Engine(font, key[1])
+    return engine
+
+
+class TestEngine(unittest.TestCase):
+
+    TEXT = u'ថ្ងៃខែឆ្នាំកំណើត ខ្ញុំ កញ្ច្រៀវ ស្ត្រី ប្រាំ, ប៉ៅ នុ៎ះ អ៊ុំ ម៉្ងៃ នំប៉័ង។ welcome\n'
+
+    def testConvert(self):
+        engine = get_engine()
+        self.assertIs(get_engine(get_font()), engine)
+        self.assertEqual(engine.unicode_to_limon(u'ខ្ញុំ'), u'´')
+        self.assertEqual(engine.limon_to_unicode(u'´'), u'ខ្ញុំ')
+        self.assertEqual(engine.limon_to_unicode(engine.unicode_to_limon(u'ក្រុមហ៊ុន')), u'ក្រុមហ៊ុន')
+        self.assertEqual(engine.unicode_to_limon(u'ខ្ញុុំ ក\u200bា្រ', normalize=True), u'´ Rka')
+        with self.assertRaises(AttributeError):
+            engine.reorder = None
+        with self.assertRaises(AttributeError):
+            engine.cache = {}
+        with self.assertRaises(ValueError):
+            Engine('abc')
+
+    def testThreads(self):
+        from concurrent.futures import ThreadPoolExecutor
+        engine = get_engine()
+        texts = [self.TEXT[i:] + self.TEXT[:i] for i in range(len(self.TEXT))] * 4
+        expected = [engine.unicode_to_limon(text) for text in texts]
+        with ThreadPoolExecutor(8) as executor:
+            self.assertEqual(list(executor.map(engine.unicode_to_limon, texts)), expected)
+            self.assertEqual(list(executor.map(engine.limon_to_unicode, expected)),
+                             [engine.limon_to_unicode(text) for text in expected])
+
+
+if __name__ == '__main__':
+    unittest.main()
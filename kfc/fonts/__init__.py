@@ -0,0 +1,147 @@
+"""
+Registry of the legacy font encodings.
+A font is described by a json table (see limon.json), it is compiled into translators the first time it is used
+and kept in memory.
+"""
+import json
+import os
+import threading
+import unittest
+from ..utils import legacy_reorder
+from ..utils.translator import Translator, compile_pattern
+
+
+FONTS_DIR = os.path.dirname(os.path.abspath(__file__))
+DEFAULT_FONT = 'limon'
+
+_sources = {}
+_fonts = {}
+_lock = threading.Lock()
+
+
+class Font:
+    """
+    A compiled legacy font encoding.
+    pre_reorder and glyphs encode unicode text around legacy_reorder.reorder, decoder decodes it back.
+    """
+
+    def __init__(self, name, table):
+        self.name = name
+        self.description = table.get('description', '')
+        compiled = compile_table(table)
+        self.pre_reorder = Translator(table['pre_reorder'], compiled['pre_reorder'])
+        self.glyphs = Translator(_glyph_table(table), compiled['glyphs'])
+        self.decoder = Translator(compiled['decoder_table'], compiled['decoder'])
+
+        # glyph classes used to find the places legacy text can be cut at
+        self.leading = set(glyph for glyph, text in self.decoder.table.items()
+                           if text == legacy_reorder.CORO or legacy_reorder.getCharClass(text[0]) == legacy_reorder._dl)
+        self.bases = set(glyph for glyph, text in self.decoder.table.items()
+                         if legacy_reorder.getCharClass(text[0]) & legacy_reorder.CF_CONSONANT)
+        self.continuations = set(char for glyph in self.decoder.table for char in glyph[1:])
+        self.glyph_chars = set(glyph[0] for glyph in self.decoder.table) | self.continuations
+
+    def __repr__(self):
+        return 'Font(%r)' % self.name
+
+
+def _glyph_table(table):
+    glyphs = {}
+    for group in table['glyphs'].values():
+        glyphs.update(group)
+    return glyphs
+
+
+def compile_table(table):
+    """ build the decoder table and the patterns of every translator of a font table """
+    glyphs = _glyph_table(table)
+    decode = table.get('decode', {})
+    encoder = Translator(glyphs)
+    decoder_table = dict((glyph, text) for text, glyph in glyphs.items() if glyph)
+    decoder_table.update(decode.get('overrides', {}))
+    # ligatures as they come out of the encoder
+    for ligature, text in table['pre_reorder'].items():
+        if ligature not in decode.get('exclude_ligatures', ()):
+            decoder_table[encoder.translate(text)] = ligature
+    return {
+        'pre_reorder': compile_pattern(table['pre_reorder']).pattern,
+        'glyphs': encoder.pattern.pattern,
+        'decoder': compile_pattern(decoder_table).pattern,
+        'decoder_table': decoder_table,
+    }
+
+
+def register_font(name, table):
+    """
+    Register a font under name. table is the path of a json table or an already loaded dict.
+    Registering is cheap, the font is compiled the first time get_font asks for it.
+    """
+    with _lock:
+        _sources[name] = table
+        _fonts.pop(name, None)
+
+
+def available_fonts():
+    return sorted(_sources)
+
+
+def _read_source(name):
+    source = _sources[name]
+    if isinstance(source, dict):
+        return source
+    with open(source, encoding='utf-8') as f:
+        return json.load(f)
+
+
+def get_font(name=DEFAULT_FONT):
+    """ return the compiled Font registered under name """
+    font = _fonts.get(name)
+    if font is not None:
+        return font
+    with _lock:
+        font = _fonts.get(name)
+        if font is None:
+            if name not in _sources:
+                raise ValueError('unknown font ' + repr(name) + ', expected one of ' + ', '.join(available_fonts()))
+            font = Font(name, _read_source(name))
+            _fonts[name] = font
+    return font
+
+
+register_font(DEFAULT_FONT, os.path.join(FONTS_DIR, 'limon.json'))
+
+
+class TestFonts(unittest.TestCase):
+
+    TABLE = {
+        'pre_reorder': {},
+        'glyphs': {'consonants': {'ក': 'A', 'ខ': 'B'}, 'vowels': {'េ': 'e'}, 'marks': {legacy_reorder.MARK: ''}},
+    }
+
+    def tearDown(self):
+        _sources.pop('test', None)
+        _fonts.pop('test', None)
+
+    def testRegister(self):
+        register_font('test', self.TABLE)
+        font = get_font('test')
+        self.assertIs(get_font('test'), font)
+        self.assertEqual(font.glyphs.translate(u'កខ'), 'AB')
+        self.assertEqual(font.decoder.translate('BeA'), u'ខេក')
+        self.assertEqual(font.leading, set('e'))
+
+    def testRegisterAgain(self):
+        register_font('test', self.TABLE)
+        first = get_font('test')
+        register_font('test', self.TABLE)
+        second = get_font('test')
+        self.assertIsNot(first, second)
+        self.assertEqual(first.decoder.pattern.pattern, second.decoder.pattern.pattern)
+
+    def testUnknownFont(self):
+        with self.assertRaises(ValueError):
+            get_font('abc')
+
+
+if __name__ == '__main__':
+    unittest.main()
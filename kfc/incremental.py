@@ -0,0 +1,199 @@
+import unittest
+from .convert import UNICODE_TO_LIMON, LIMON_TO_UNICODE, get_direction
+from .limon_to_unicode import limon_to_unicode
+from .unicode_to_limon import unicode_to_limon
+
+
+class _Lengths:
+    """ Fenwick tree of block lengths: offset of a block and block at an offset in O(log n) """
+
+    def __init__(self, lengths):
+        self.build(lengths)
+
+    def build(self, lengths):
+        self.size = len(lengths)
+        self.tree = tree = [0] + list(lengths)
+        for i in range(1, self.size + 1):
+            parent = i + (i & -i)
+            if parent <= self.size:
+                tree[parent] += tree[i]
+        self.step = 1 << max(0, self.size.bit_length() - 1)
+
+    def add(self, index, delta):
+        index += 1
+        while index <= self.size:
+            self.tree[index] += delta
+            index += index & -index
+
+    def offset(self, index):
+        """ sum of the lengths of the blocks before index """
+        total = 0
+        while index > 0:
+            total += self.tree[index]
+            index -= index & -index
+        return total
+
+    def find(self, offset):
+        """ index of the block holding offset, the number of blocks when offset is at or past the end """
+        index = 0
+        step = self.step
+        while step:
+            following = index + step
+            if following <= self.size and self.tree[following] <= offset:
+                index = following
+                offset -= self.tree[following]
+            step >>= 1
+        return index
+
+
+class IncrementalConverter:
+    """
+    A document kept converted while it is edited.
+    The text is held in blocks of about block_size characters cut at cluster boundaries, each with its converted
+    output. An edit converts again the blocks it touches, and their neighbours when it joins clusters across them,
+    so its cost depends on the size of the edit and not on the size of the document.
+    """
+
+    def __init__(self, text='', direction=UNICODE_TO_LIMON, block_size=1024, **kwargs):
+        if block_size < 1:
+            raise ValueError('block_size must be positive')
+        self._convert, self._boundary = get_direction(direction)
+        self._kwargs = kwargs
+        self.block_size = block_size
+        self._sources = self._split(text)
+        self._targets = [self._convert(block, **kwargs) for block in self._sources]
+        self._source_lengths = _Lengths([len(block) for block in self._sources])
+        self._target_lengths = _Lengths([len(block) for block in self._targets])
+
+    @property
+    def text(self):
+        return ''.join(self._sources)
+
+    @property
+    def output(self):
+        return ''.join(self._targets)
+
+    def __len__(self):
+        return self._source_lengths.offset(len(self._sources))
+
+    def _split(self, text):
+        """ cut text into blocks of about block_size characters at cluster boundaries """
+        blocks = []
+        size = self.block_size
+        start = 0
+        while len(text) - start > size:
+            window = size
+            cut = 0
+            while not cut and start + window < len(text):
+                cut = self._boundary(text[start:start + window])
+                window *= 2
+            if not cut:
+                break
+            blocks.append(text[start:start + cut])
+            start += cut
+        if start < len(text):
+            blocks.append(text[start:])
+        return blocks
+
+    def _joins(self, before, after):
+        """ whether text ending with before and text starting with after are converted independently """
+        return not before or not after or self._boundary(before[-1] + after[0]) == 1
+
+    def edit(self, start, end, replacement):
+        """
+        replace text[start:end] with replacement
+        return (start, end, replacement) of the edit that brings the previous output to the new one
+        """
+        length = len(self)
+        if not 0 <= start <= end <= length:
+            raise ValueError('edit (%d, %d) out of range 0..%d' % (start, end, length))
+        sources = self._sources
+        first = min(self._source_lengths.find(start), max(0, len(sources) - 1))
+        last = max(first, min(self._source_lengths.find(max(start, end - 1)), len(sources) - 1))
+        region_start = self._source_lengths.offset(first)
+        old = ''.join(sources[first:last + 1])
+        region = old[:start - region_start] + replacement + old[end - region_start:]
+
+        # clusters joined across the edited blocks pull their neighbours in
+        while True:
+            following = sources[last + 1] if last + 1 < len(sources) else ''
+            if first > 0 and not self._joins(sources[first - 1], region or following):
+                first -= 1
+                region = sources[first] + region
+            elif following and not self._joins(sources[first - 1] + region if first > 0 else region, following):
+                last += 1
+                region += following
+            else:
+                break
+
+        blocks = self._split(region)
+        targets = [self._convert(block, **self._kwargs) for block in blocks]
+        target_start = self._target_lengths.offset(first)
+        previous = ''.join(self._targets[first:last + 1])
+        count = last + 1 - first if sources else 0
+        if len(blocks) == count:
+            for i, (block, target) in enumerate(zip(blocks, targets)):
+                self._source_lengths.add(first + i, len(block) - len(sources[first + i]))
+                self._target_lengths.add(first + i, len(target) - len(self._targets[first + i]))
+            sources[first:last + 1] = blocks
+            self._targets[first:last + 1] = targets
+        else:
+            sources[first:first + count] = blocks
+            self._targets[first:first + count] = targets
+            self._source_lengths.build([len(block) for block in sources])
+            self._target_lengths.build([len(block) for block in self._targets])
+        return _diff(target_start, previous, ''.join(targets))
+
+
+def _diff(offset, before, after):
+    """ the smallest (start, end, replacement) turning before, found at offset, into after """
+    prefix = 0
+    shortest = min(len(before), len(after))
+    while prefix < shortest and before[prefix] == after[prefix]:
+        prefix += 1
+    suffix = 0
+    while suffix < shortest - prefix and before[-1 - suffix] == after[-1 - suffix]:
+        suffix += 1
+    return offset + prefix, offset + len(before) - suffix, after[prefix:len(after) - suffix]
+
+
+class TestIncremental(unittest.TestCase):
+
+    UNICODE = u'ថ្ងៃខែឆ្នាំកំណើត ខ្ញុំ កញ្ច្រៀវ ស្ត្រី ប្រាំ, ប៉ៅ នុ៎ះ អ៊ុំ ម៉្ងៃ នំប៉័ង។ welcome\n'
+
+    def check(self, direction, convert, text, pieces):
+        import random
+        rng = random.Random(0)
+        document = IncrementalConverter(text, direction, block_size=16)
+        output = document.output
+        self.assertEqual(output, convert(text))
+        for _ in range(300):
+            start = rng.randrange(len(text) + 1)
+            end = min(len(text), start + rng.choice([0, 0, 1, 2, 5]))
+            replacement = ''.join(rng.choice(pieces) for _ in range(rng.choice([0, 1, 1, 3])))
+            diff_start, diff_end, diff = document.edit(start, end, replacement)
+            text = text[:start] + replacement + text[end:]
+            output = output[:diff_start] + diff + output[diff_end:]
+            self.assertEqual(document.text, text)
+            self.assertEqual(output, convert(text))
+            self.assertEqual(document.output, output)
+            self.assertEqual(len(document), len(text))
+
+    def testUnicodeToLimon(self):
+        self.check(UNICODE_TO_LIMON, unicode_to_limon, self.UNICODE * 4, list(self.UNICODE) + [u'្', u'េ', u'ា'])
+
+    def testLimonToUnicode(self):
+        limon = unicode_to_limon(self.UNICODE * 4)
+        self.check(LIMON_TO_UNICODE, limon_to_unicode, limon, list(limon))
+
+    def testEmpty(self):
+        document = IncrementalConverter()
+        self.assertEqual(document.edit(0, 0, u'ខ្ញុំ'), (0, 0, u'´'))
+        self.assertEqual(document.edit(0, 5, u''), (0, 1, u''))
+        self.assertEqual(document.output, u'')
+        with self.assertRaises(ValueError):
+            document.edit(0, 1, u'')
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,136 @@
+"""
+Opt-in timing and statistics of unicode_to_limon.
+While no collector or listener is registered, enabled is False and the converter does no extra work.
+"""
+import re
+import threading
+import unittest
+from contextlib import contextmanager
+
+
+STAGES = ('pre_reorder', 'reorder', 'glyphs')
+
+# khmer characters left in the output had no glyph
+_khmer = re.compile('[\u1780-\u17ff\u19e0-\u19ff]')
+
+enabled = False
+_collectors = []
+_listeners = []
+# conversions running in threads add to the same collectors
+_lock = threading.Lock()
+
+
+class ConversionStats:
+    """ counters of one or more conversions """
+
+    __slots__ = ('calls', 'chars', 'seconds', 'clusters', 'dotcircle_clusters', 'unmapped', 'marks')
+
+    def __init__(self):
+        self.calls = 0
+        self.chars = 0
+        self.seconds = dict.fromkeys(STAGES, 0.0)
+        self.clusters = 0
+        self.dotcircle_clusters = 0
+        self.unmapped = 0
+        self.marks = 0
+
+    def add(self, other):
+        """ add the counters of other to this one """
+        self.calls += other.calls
+        self.chars += other.chars
+        for stage, seconds in other.seconds.items():
+            self.seconds[stage] = self.seconds.get(stage, 0.0) + seconds
+        self.clusters += other.clusters
+        self.dotcircle_clusters += other.dotcircle_clusters
+        self.unmapped += other.unmapped
+        self.marks += other.marks
+
+    def as_dict(self):
+        return {
+            'calls': self.calls,
+            'chars': self.chars,
+            'seconds': dict(self.seconds),
+            'clusters': self.clusters,
+            'dotcircle_clusters': self.dotcircle_clusters,
+            'unmapped': self.unmapped,
+            'marks': self.marks,
+        }
+
+    def __repr__(self):
+        return 'ConversionStats(' + ', '.join('%s=%r' % item for item in self.as_dict().items()) + ')'
+
+
+def _update():
+    global enabled
+    enabled = bool(_collectors or _listeners)
+
+
+def add_listener(callback):
+    """ call callback(stats) with the ConversionStats of every conversion """
+    _listeners.append(callback)
+    _update()
+
+
+def remove_listener(callback):
+    _listeners.remove(callback)
+    _update()
+
+
+@contextmanager
+def collect():
+    """ context manager yielding a ConversionStats that adds up every conversion run inside it """
+    stats = ConversionStats()
+    _collectors.append(stats)
+    _update()
+    try:
+        yield stats
+    finally:
+        _collectors.remove(stats)
+        _update()
+
+
+def count_unmapped(text):
+    return len(_khmer.findall(text))
+
+
+def emit(stats):
+    """ hand the stats of one conversion to the collectors and listeners """
+    with _lock:
+        for collector in _collectors:
+            collector.add(stats)
+    for listener in _listeners:
+        listener(stats)
+
+
+class TestInstrument(unittest.TestCase):
+
+    def testCollect(self):
+        from .unicode_to_limon import unicode_to_limon
+        self.assertFalse(enabled)
+        with collect() as stats:
+            self.assertTrue(enabled)
+            unicode_to_limon(u'ថ្ងៃខែ ប៊ី ា ៝')
+            unicode_to_limon(u'ស្ត្រី')
+        self.assertFalse(enabled)
+        self.assertEqual(stats.calls, 2)
+        self.assertEqual(stats.chars, 20)
+        self.assertEqual(stats.clusters, 6)
+        self.assertEqual(stats.dotcircle_clusters, 2)
+        self.assertEqual(stats.unmapped, 1)
+        self.assertEqual(stats.marks, 1)
+        self.assertEqual(set(stats.seconds), set(STAGES))
+
+    def testListener(self):
+        from .unicode_to_limon import unicode_to_limon
+        seen = []
+        add_listener(seen.append)
+        try:
+            unicode_to_limon(u'ក')
+        finally:
+            remove_listener(seen.append)
+        unicode_to_limon(u'ក')
+        self.assertEqual([stats.chars for stats in seen], [1])
+
+
+if __name__ == '__main__':
+    unittest.main()
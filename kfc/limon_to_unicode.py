@@ -1,3 +1,112 @@
-def limon_to_unicode(text):
-    """ converts text in limon format to unicode format """
-    return text
+import unittest
+from .engine import get_engine
+from .fonts import DEFAULT_FONT, get_font
+from .utils import legacy_reorder
+from .utils.alignment import Alignment
+from .utils.cache import convert_words
+from .unicode_to_limon import unicode_to_limon
+
+
+def last_boundary(text, font=DEFAULT_FONT, start=0):
+    """
+    Return the index of the last glyph that always starts a new cluster, 0 if there is none.
+    text[:index] and text[index:] can be converted independently. Only the indexes from start on are looked at.
+    """
+    font = get_font(font)
+    leading = font.leading
+    cursor = len(text) - 1
+    stop = max(start, 1)
+    while (cursor >= stop):
+        char = text[cursor]
+        if (char not in font.continuations) and (text[cursor - 1] not in leading) and \
+                (char in leading or char in font.bases or char not in font.glyph_chars):
+            return cursor
+        cursor -= 1
+    return 0
+
+
+def limon_to_unicode(text, cache=None, font=DEFAULT_FONT, align=False, detect=False):
+    """
+    converts text in limon format, or in another legacy font registered in kfc.fonts, to unicode format
+    words are memoized in cache when a utils.cache.ConversionCache is given
+    with align, return (unicode, utils.alignment.Alignment) mapping the offsets of text to the offsets of unicode
+    with detect, only the spans kfc.detect finds to be limon are converted, the Latin script text around them is
+    copied through
+    """
+    if detect:
+        if align:
+            raise ValueError('align cannot be combined with detect')
+        return _convert_detected(text, cache, font)
+    if align:
+        if cache is not None:
+            raise ValueError('align cannot be combined with cache')
+        decoded = Alignment()
+        text = get_font(font).decoder.translate(text, decoded)
+        reordered = Alignment()
+        text = legacy_reorder.inverse_reorder(text, reordered)
+        return text, decoded.compose(reordered)
+    if cache is not None:
+        return convert_words(lambda words: limon_to_unicode(words, font=font), text, cache)
+    return get_engine(font).limon_to_unicode(text)
+
+
+def _convert_detected(text, cache, font):
+    """ convert the limon spans of text and copy the rest """
+    from .detect import limon_spans
+    parts = []
+    last = 0
+    for start, end in limon_spans(text, font):
+        parts.append(text[last:start])
+        parts.append(limon_to_unicode(text[start:end], cache, font))
+        last = end
+    parts.append(text[last:])
+    return ''.join(parts)
+
+
+class TestLimonToUnicode(unittest.TestCase):
+
+    def testAlign(self):
+        unicode, alignment = limon_to_unicode(u'éf¶ Rkum/ ´', align=True)
+        self.assertEqual(unicode, u'ថ្ងៃ ក្រុម, ខ្ញុំ')
+        self.assertEqual(alignment.to_target(5, 6), (5, 9))
+        self.assertEqual(alignment.to_source(12, 17), (10, 11))
+
+    def testConversion(self):
+        self.assertEqual(limon_to_unicode(u'éf¶ExqñaMkMeNIt'), u'ថ្ងៃខែឆ្នាំកំណើត')
+        self.assertEqual(limon_to_unicode(u'´'), u'ខ្ញុំ')
+        self.assertEqual(limon_to_unicode(u'RBH'), u'ព្រះ')
+        self.assertEqual(limon_to_unicode(u'¬50°¦'), u'(៥០%)')
+
+    def testLigatures(self):
+        self.assertEqual(limon_to_unicode(u'BaØa'), u'ញ្ញា')
+        self.assertEqual(limon_to_unicode(u'b£'), u'ឫ')
+        self.assertEqual(limon_to_unicode(u'suI'), u'ស៊ី')
+        self.assertEqual(limon_to_unicode(u's×'), u'សិ៍')
+
+    def testRoundTrip(self):
+        for text in [u'កញ្ច្រៀវ', u'ស្ត្រី', u'ប្រាំ', u'ប៉ៅ', u'នុ៎ះ', u'អ៊ុំ', u'ម៉្ងៃ', u'នំប៉័ង',
+                     u'ក្រុមហ៊ុន', u'ប្បា', u'ចំពោះ', u'ក្បាល, ខ្ញុំ។']:
+            self.assertEqual(limon_to_unicode(unicode_to_limon(text)), text)
+
+    def testDetect(self):
+        english = u'The report was published in Phnom Penh on Monday.'
+        text = english + u' éf¶ExqñaMkMeNIt ´ RsþI/ welcome to the site'
+        self.assertEqual(limon_to_unicode(text, detect=True), english + u' ថ្ងៃខែឆ្នាំកំណើត ខ្ញុំ ស្ត្រី, welcome to the site')
+        with self.assertRaises(ValueError):
+            limon_to_unicode(text, align=True, detect=True)
+
+    def testLastBoundary(self):
+        self.assertEqual(last_boundary(u'éf¶Exq'), 5)
+        self.assertEqual(last_boundary(u'éf¶E'), 3)
+        self.assertEqual(last_boundary(u'eRbA'), 0)
+        self.assertEqual(last_boundary(u'éf¶Exq', start=5), 5)
+        self.assertEqual(last_boundary(u'éf¶Exq', start=6), 0)
+        text = u'éf¶ExqñaMkMeNIt BaØa b£ suI'
+        for i in range(len(text)):
+            cut = last_boundary(text[:i])
+            self.assertEqual(limon_to_unicode(text[:cut]) + limon_to_unicode(text[cut:]), limon_to_unicode(text))
+
+
+
+if __name__ == '__main__':
+    unittest.main()
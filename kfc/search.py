@@ -0,0 +1,305 @@
+"""
+Search limon encoded files with unicode queries, without converting them.
+A query is compiled into the limon bytes it can appear as: every cluster is rendered by the unicode_to_limon pipeline,
+and the last cluster also matches when the text extends it with a vowel or coeng RO written before it (ការ is found
+in ការេ). Files are scanned as memory mapped bytes, an NgramIndex narrows repeated searches down to the windows of
+the files holding every trigram of the query.
+"""
+import argparse
+import array
+import json
+import mmap
+import os
+import re
+import unittest
+from .fonts import DEFAULT_FONT, get_font
+from .utils.legacy_reorder import CORO, iter_clusters, reorder
+from .utils.normalization import normalize
+
+
+# every glyph of a limon font has a single byte code in cp1252
+LIMON_ENCODING = 'cp1252'
+
+# vowels rendered before the base of their cluster, and coeng RO
+_LEADING = tuple(u'េែៃោៅើឿៀ') + (CORO,)
+
+
+class Query:
+    """ a unicode query compiled to limon bytes """
+
+    def __init__(self, query, font=DEFAULT_FONT, encoding=LIMON_ENCODING, extend=True):
+        font = get_font(font)
+        text = font.pre_reorder.translate(normalize(query))
+        if not text:
+            raise ValueError('empty query')
+        clusters = [text[cluster.start:cluster.end] for cluster in iter_clusters(text)]
+        glyphs = font.glyphs.translate
+
+        def render(cluster):
+            return [glyphs(reorder(cluster)).encode(encoding)]
+
+        self.query = query
+        # the alternatives of every cluster, longest first
+        self.clusters = [render(cluster) for cluster in clusters]
+        if extend:
+            last = clusters[-1]
+            own = self.clusters[-1][0]
+            extended = set(self.clusters[-1])
+            for leading in _LEADING:
+                for variant in render(normalize(last + leading)):
+                    # the leading glyphs of the extended cluster followed by the glyphs of the query
+                    start = variant.find(own)
+                    if start > 0:
+                        extended.add(variant[:start + len(own)])
+            self.clusters[-1] = sorted(extended, key=len, reverse=True)
+        self.regex = re.compile(b''.join(
+            re.escape(variants[0]) if len(variants) == 1 else b'(?:' + b'|'.join(map(re.escape, variants)) + b')'
+            for variants in self.clusters))
+        self.max_length = sum(len(variants[0]) for variants in self.clusters)
+
+    def segments(self):
+        """ the runs of bytes found in every match """
+        segments = []
+        run = b''
+        for variants in self.clusters:
+            if len(variants) == 1:
+                run += variants[0]
+                continue
+            if run:
+                segments.append(run)
+            # every alternative of the last cluster ends with its own rendering
+            run = variants[-1] if all(variant.endswith(variants[-1]) for variant in variants) else b''
+        if run:
+            segments.append(run)
+        return segments
+
+    def finditer(self, data, start=0, end=None):
+        """ yield the (start, end) offsets of the matches in bytes, a bytearray or an mmap """
+        for match in self.regex.finditer(data, start, len(data) if end is None else end):
+            yield match.span()
+
+    def __repr__(self):
+        return 'Query(%r)' % self.query
+
+
+def compile_query(query, font=DEFAULT_FONT, encoding=LIMON_ENCODING, extend=True):
+    return query if isinstance(query, Query) else Query(query, font, encoding, extend)
+
+
+def search(data, query, font=DEFAULT_FONT):
+    """ return the (start, end) offsets of query in limon bytes, or in a limon string """
+    if isinstance(data, str):
+        data = data.encode(LIMON_ENCODING)
+    return list(compile_query(query, font).finditer(data))
+
+
+def _mapped(path):
+    """ the read only mmap of a file, None when it is empty """
+    with open(path, 'rb') as f:
+        if not os.fstat(f.fileno()).st_size:
+            return None
+        return mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+
+
+def search_file(path, query, font=DEFAULT_FONT):
+    """ yield the (start, end) byte offsets of query in a limon file """
+    query = compile_query(query, font)
+    data = _mapped(path)
+    if data is None:
+        return
+    with data:
+        yield from query.finditer(data)
+
+
+class NgramIndex:
+    """
+    Index of the byte n-grams of limon files, kept for repeated searches.
+    Every file is cut into windows of window_size bytes, each indexed with the overlap bytes following it, so a
+    match shorter than overlap lies inside the window it starts in. Only the windows holding every n-gram of a query
+    are scanned, longer matches and files changed since they were indexed are scanned in full.
+    """
+
+    def __init__(self, n=3, window_size=65536, overlap=1024):
+        if n < 1 or window_size < 1 or overlap < n:
+            raise ValueError('n and window_size must be positive and overlap at least n')
+        self.n = n
+        self.window_size = window_size
+        self.overlap = overlap
+        # path -> (size, mtime, first window)
+        self.files = {}
+        # window -> path
+        self.windows = []
+        self.postings = {}
+
+    def add(self, path):
+        """ index a file, its windows follow those of the files indexed before """
+        if path in self.files:
+            raise ValueError(repr(path) + ' is already indexed')
+        status = os.stat(path)
+        self.files[path] = (status.st_size, status.st_mtime_ns, len(self.windows))
+        data = _mapped(path)
+        if data is None:
+            return
+        n = self.n
+        postings = self.postings
+        with data:
+            for start in range(0, len(data), self.window_size):
+                window = len(self.windows)
+                self.windows.append(path)
+                chunk = data[start:start + self.window_size + self.overlap]
+                for gram in set(chunk[i:i + n] for i in range(len(chunk) - n + 1)):
+                    posting = postings.get(gram)
+                    if posting is None:
+                        posting = postings[gram] = array.array('I')
+                    posting.append(window)
+
+    def _candidates(self, query):
+        """ the windows holding every n-gram of query, None when any window can match """
+        n = self.n
+        grams = set(segment[i:i + n] for segment in query.segments() for i in range(len(segment) - n + 1))
+        if not grams or query.max_length > self.overlap:
+            return None
+        windows = None
+        for gram in sorted(grams, key=lambda gram: len(self.postings.get(gram, ()))):
+            posting = self.postings.get(gram)
+            if posting is None:
+                return set()
+            windows = set(posting) if windows is None else windows.intersection(posting)
+            if not windows:
+                break
+        return windows
+
+    def search(self, query, font=DEFAULT_FONT):
+        """ yield (path, start, end) of the matches of query in the indexed files """
+        query = compile_query(query, font)
+        candidates = self._candidates(query)
+        for path, (size, mtime, first) in self.files.items():
+            try:
+                status = os.stat(path)
+            except FileNotFoundError:
+                continue
+            if candidates is None or (status.st_size, status.st_mtime_ns) != (size, mtime):
+                for start, end in search_file(path, query):
+                    yield path, start, end
+                continue
+            windows = sorted(window for window in candidates if self.windows[window] == path)
+            if not windows:
+                continue
+            data = _mapped(path)
+            with data:
+                for window in windows:
+                    start = (window - first) * self.window_size
+                    for match_start, match_end in query.finditer(data, start, start + self.window_size + self.overlap):
+                        # the matches starting in the overlap belong to the next window
+                        if match_start < start + self.window_size:
+                            yield path, match_start, match_end
+
+    def save(self, path):
+        with open(path, 'w', encoding='utf-8') as f:
+            json.dump({
+                'n': self.n,
+                'window_size': self.window_size,
+                'overlap': self.overlap,
+                'files': self.files,
+                'windows': self.windows,
+                # every byte is one latin-1 character
+                'postings': dict((gram.decode('latin-1'), posting.tolist()) for gram, posting in self.postings.items()),
+            }, f)
+
+    @classmethod
+    def load(cls, path):
+        with open(path, encoding='utf-8') as f:
+            saved = json.load(f)
+        index = cls(saved['n'], saved['window_size'], saved['overlap'])
+        index.files = dict((name, tuple(value)) for name, value in saved['files'].items())
+        index.windows = saved['windows']
+        index.postings = dict((gram.encode('latin-1'), array.array('I', posting))
+                              for gram, posting in saved['postings'].items())
+        return index
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(prog='kfc search', description=__doc__.splitlines()[1])
+    parser.add_argument('query', help='unicode text to find')
+    parser.add_argument('files', nargs='+', help='limon files')
+    parser.add_argument('--font', default=DEFAULT_FONT)
+    parser.add_argument('--index', help='search the files of a saved NgramIndex, built first when it does not exist')
+    args = parser.parse_args(argv)
+
+    query = compile_query(args.query, args.font)
+    if args.index:
+        if os.path.exists(args.index):
+            index = NgramIndex.load(args.index)
+        else:
+            index = NgramIndex()
+            for path in args.files:
+                index.add(path)
+            index.save(args.index)
+        matches = index.search(query)
+    else:
+        matches = ((path, start, end) for path in args.files for start, end in search_file(path, query))
+    found = 0
+    for path, start, end in matches:
+        print('%s:%d:%d' % (path, start, end))
+        found += 1
+    return 0 if found else 1
+
+
+class TestSearch(unittest.TestCase):
+
+    UNICODE = u'ថ្ងៃខែឆ្នាំកំណើត ខ្ញុំ កញ្ច្រៀវ ស្ត្រី ប្រាំ, ប៉ៅ នុ៎ះ អ៊ុំ ម៉្ងៃ នំប៉័ង។ ការ ការេ ក្រុមហ៊ុន\n'
+
+    def limon(self, text):
+        from .unicode_to_limon import unicode_to_limon
+        return unicode_to_limon(text).encode(LIMON_ENCODING)
+
+    def testSearch(self):
+        data = self.limon(self.UNICODE)
+        for word in (u'ខ្ញុំ', u'ស្ត្រី', u'ប៉ៅ', u'នំប៉័ង', u'ក្រុមហ៊ុន', u'កញ្ច្រៀវ'):
+            matches = search(data, word)
+            self.assertEqual(len(matches), 1, word)
+            start, end = matches[0]
+            self.assertEqual(data[start:end], self.limon(word))
+        # the last cluster extended with SRAE
+        self.assertEqual(len(search(data, u'ការ')), 2)
+        self.assertEqual(len(search(data, u'ការេ')), 1)
+        # messy queries are normalized
+        self.assertEqual(len(search(data, u'ស្រ្តី')), 1)
+        self.assertEqual(search(data, u'ភ្នំពេញ'), [])
+        with self.assertRaises(ValueError):
+            Query(u'')
+
+    def testFiles(self):
+        import shutil
+        import tempfile
+        directory = tempfile.mkdtemp()
+        try:
+            paths = []
+            for i, text in enumerate((self.UNICODE * 50, u'ខ្ញុំ' * 20 + self.UNICODE, u'')):
+                paths.append(os.path.join(directory, '%d.txt' % i))
+                with open(paths[-1], 'wb') as f:
+                    f.write(self.limon(text))
+            self.assertEqual(len(list(search_file(paths[0], u'ស្ត្រី'))), 50)
+            self.assertEqual(list(search_file(paths[2], u'ស្ត្រី')), [])
+
+            index = NgramIndex(window_size=256, overlap=64)
+            for path in paths:
+                index.add(path)
+            expected = sorted((path, start, end) for path in paths for start, end in search_file(path, u'ខ្ញុំ ក'))
+            self.assertEqual(sorted(index.search(u'ខ្ញុំ ក')), expected)
+            self.assertEqual(len(expected), 51)
+            self.assertEqual(list(index.search(u'ភ្នំពេញ')), [])
+            index.save(os.path.join(directory, 'index.json'))
+            loaded = NgramIndex.load(os.path.join(directory, 'index.json'))
+            self.assertEqual(sorted(loaded.search(u'ស្ត្រី')), sorted(index.search(u'ស្ត្រី')))
+
+            # a changed file is scanned in full
+            with open(paths[2], 'wb') as f:
+                f.write(self.limon(u'ស្ត្រី ស្ត្រី'))
+            self.assertEqual(len([path for path, _, _ in loaded.search(u'ស្ត្រី') if path == paths[2]]), 2)
+        finally:
+            shutil.rmtree(directory)
+
+
+if __name__ == '__main__':
+    unittest.main()
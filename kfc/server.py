@@ -0,0 +1,335 @@
+"""
+Long running conversion server for callers in other languages, the fonts are compiled once and kept warm.
+
+    kfc serve                               # frames on stdin and stdout
+    kfc serve --socket /run/kfc.sock        # frames on a unix socket, any number of clients
+    kfc serve --http 8080                   # POST /unicode_to_limon and /limon_to_unicode on 127.0.0.1
+
+A frame is a 4 byte big endian length followed by that many bytes. A request frame holds an operation byte and
+utf-8 text: u converts unicode to limon, l limon to unicode, U and L do the same for a batch, a sequence of texts
+each prefixed with its 4 byte length. The response frame holds + and the converted text or batch, or - and an
+error message. Requests can be pipelined, the responses come back in order, those of the requests read together
+in one write.
+"""
+import argparse
+import json
+import os
+import socket
+import socketserver
+import stat
+import struct
+import sys
+import threading
+import unittest
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from .convert import UNICODE_TO_LIMON, LIMON_TO_UNICODE
+from .engine import get_engine
+from .fonts import DEFAULT_FONT
+
+
+# largest frame accepted, a client sending more is disconnected
+MAX_FRAME = 64 * 1024 * 1024
+
+OK = b'+'
+ERROR = b'-'
+
+_operations = {
+    ord('u'): UNICODE_TO_LIMON,
+    ord('l'): LIMON_TO_UNICODE,
+}
+_length = struct.Struct('>I')
+
+
+def encode_frame(payload):
+    return _length.pack(len(payload)) + payload
+
+
+def encode_batch(texts):
+    """ the body of a batch, every text prefixed with its length """
+    return b''.join(encode_frame(text.encode('utf-8')) for text in texts)
+
+
+def decode_batch(body):
+    """ the texts of a batch body """
+    texts = []
+    offset = 0
+    while offset < len(body):
+        if len(body) - offset < 4:
+            raise ValueError('truncated batch')
+        length, = _length.unpack_from(body, offset)
+        offset += 4
+        if len(body) - offset < length:
+            raise ValueError('truncated batch')
+        texts.append(body[offset:offset + length].decode('utf-8'))
+        offset += length
+    return texts
+
+
+def handle(request, font=DEFAULT_FONT):
+    """ the response payload of a request payload """
+    try:
+        if not request:
+            raise ValueError('empty request')
+        operation = request[0]
+        direction = _operations.get(operation | 0x20)
+        if direction is None:
+            raise ValueError('unknown operation ' + repr(chr(operation)))
+        convert = getattr(get_engine(font), direction)
+        if operation & 0x20:
+            return OK + convert(request[1:].decode('utf-8')).encode('utf-8')
+        return OK + encode_batch([convert(text) for text in decode_batch(request[1:])])
+    except ValueError as e:
+        # UnicodeDecodeError is a ValueError too
+        return ERROR + str(e).encode('utf-8')
+
+
+def serve_stream(read, write, font=DEFAULT_FONT):
+    """
+    answer the frames read with read(size) until it returns no data, write(data) sends the responses
+    every read returns the frames available, they are answered together
+    """
+    buffer = bytearray()
+    while True:
+        chunk = read(65536)
+        if not chunk:
+            return
+        buffer += chunk
+        responses = []
+        offset = 0
+        while len(buffer) - offset >= 4:
+            length, = _length.unpack_from(buffer, offset)
+            if length > MAX_FRAME:
+                write(encode_frame(ERROR + b'frame too large'))
+                return
+            if len(buffer) - offset - 4 < length:
+                break
+            responses.append(encode_frame(handle(bytes(buffer[offset + 4:offset + 4 + length]), font)))
+            offset += 4 + length
+        del buffer[:offset]
+        if responses:
+            write(b''.join(responses))
+
+
+def serve_stdio(font=DEFAULT_FONT):
+    """ answer the frames of stdin on stdout until stdin is closed """
+    stdin, stdout = sys.stdin.fileno(), sys.stdout.fileno()
+
+    def write(data):
+        view = memoryview(data)
+        while view:
+            view = view[os.write(stdout, view):]
+
+    serve_stream(lambda size: os.read(stdin, size), write, font)
+
+
+class _StreamHandler(socketserver.BaseRequestHandler):
+
+    def handle(self):
+        serve_stream(self.request.recv, self.request.sendall, self.server.font)
+
+
+class UnixServer(socketserver.ThreadingUnixStreamServer):
+    """ the frame protocol on a unix socket, a thread per client """
+
+    daemon_threads = True
+
+    def __init__(self, path, font=DEFAULT_FONT):
+        self.font = font
+        try:
+            mode = os.lstat(path).st_mode
+        except FileNotFoundError:
+            pass
+        else:
+            if not stat.S_ISSOCK(mode):
+                raise FileExistsError(repr(path) + ' exists and is not a socket')
+            # a socket left behind by a previous server
+            os.unlink(path)
+        super().__init__(path, _StreamHandler)
+
+    def server_close(self):
+        super().server_close()
+        if os.path.exists(self.server_address):
+            os.unlink(self.server_address)
+
+
+class _HttpHandler(BaseHTTPRequestHandler):
+
+    protocol_version = 'HTTP/1.1'
+
+    def do_POST(self):
+        direction = self.path.strip('/')
+        if direction not in (UNICODE_TO_LIMON, LIMON_TO_UNICODE):
+            return self._reply(404, 'text/plain', 'unknown path ' + self.path)
+        convert = getattr(get_engine(self.server.font), direction)
+        body = None
+        try:
+            length = int(self.headers.get('Content-Length', 0))
+            if length < 0:
+                raise ValueError('negative Content-Length')
+            if length > MAX_FRAME:
+                # the body is left unread
+                self.close_connection = True
+                return self._reply(413, 'text/plain', 'body too large')
+            body = self.rfile.read(length)
+            if self.headers.get('Content-Type', '').startswith('application/json'):
+                texts = json.loads(body.decode('utf-8'))
+                if not isinstance(texts, list) or not all(isinstance(text, str) for text in texts):
+                    raise ValueError('expected a list of strings')
+                return self._reply(200, 'application/json', json.dumps([convert(text) for text in texts]))
+            return self._reply(200, 'text/plain; charset=utf-8', convert(body.decode('utf-8')))
+        except ValueError as e:
+            if body is None:
+                # a bad Content-Length, the body cannot be skipped
+                self.close_connection = True
+            return self._reply(400, 'text/plain', str(e))
+
+    def _reply(self, status, content_type, text):
+        data = text.encode('utf-8')
+        self.send_response(status)
+        self.send_header('Content-Type', content_type)
+        self.send_header('Content-Length', str(len(data)))
+        self.end_headers()
+        self.wfile.write(data)
+
+    def log_message(self, format, *args):
+        pass
+
+
+class HttpServer(ThreadingHTTPServer):
+    """ POST text to /unicode_to_limon or /limon_to_unicode, or a json list of texts """
+
+    daemon_threads = True
+
+    def __init__(self, port, host='127.0.0.1', font=DEFAULT_FONT):
+        self.font = font
+        super().__init__((host, port), _HttpHandler)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(prog='kfc serve', description=__doc__.splitlines()[1])
+    parser.add_argument('--socket', help='path of a unix socket to listen on')
+    parser.add_argument('--http', type=int, help='port of a local http server')
+    parser.add_argument('--host', default='127.0.0.1', help='address of the http server')
+    parser.add_argument('--font', default=DEFAULT_FONT)
+    args = parser.parse_args(argv)
+
+    # compile the font before the first request
+    get_engine(args.font)
+    servers = []
+    if args.socket:
+        servers.append(UnixServer(args.socket, args.font))
+    if args.http is not None:
+        servers.append(HttpServer(args.http, args.host, args.font))
+    try:
+        if not servers:
+            serve_stdio(args.font)
+            return 0
+        for server in servers[1:]:
+            threading.Thread(target=server.serve_forever, daemon=True).start()
+        servers[0].serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        for server in servers:
+            server.server_close()
+    return 0
+
+
+class TestServer(unittest.TestCase):
+
+    UNICODE = u'ថ្ងៃខែឆ្នាំកំណើត ខ្ញុំ ស្ត្រី, welcome'
+
+    def expected(self):
+        from .unicode_to_limon import unicode_to_limon
+        return unicode_to_limon(self.UNICODE)
+
+    def receive(self, connection, size):
+        data = b''
+        while len(data) < size:
+            chunk = connection.recv(size - len(data))
+            self.assertTrue(chunk)
+            data += chunk
+        return data
+
+    def read_frame(self, connection):
+        return self.receive(connection, _length.unpack(self.receive(connection, 4))[0])
+
+    def testHandle(self):
+        limon = self.expected()
+        self.assertEqual(handle(b'u' + self.UNICODE.encode('utf-8')), OK + limon.encode('utf-8'))
+        self.assertEqual(handle(b'l' + u'´'.encode('utf-8')), OK + u'ខ្ញុំ'.encode('utf-8'))
+        batch = handle(b'U' + encode_batch([self.UNICODE, u'', u'ខ្ញុំ']))
+        self.assertEqual(decode_batch(batch[1:]), [limon, u'', u'´'])
+        self.assertEqual(handle(b'x')[:1], ERROR)
+        self.assertEqual(handle(b'u\xff')[:1], ERROR)
+        self.assertEqual(handle(b'U\x00\x00\x00\x09ab')[:1], ERROR)
+
+    def testPipelined(self):
+        client, server = socket.socketpair()
+        thread = threading.Thread(target=serve_stream, args=(server.recv, server.sendall))
+        thread.start()
+        requests = [b'u' + self.UNICODE.encode('utf-8'), b'x', b'l' + u'´'.encode('utf-8')]
+        client.sendall(b''.join(encode_frame(request) for request in requests))
+        self.assertEqual(self.read_frame(client), OK + self.expected().encode('utf-8'))
+        self.assertEqual(self.read_frame(client)[:1], ERROR)
+        self.assertEqual(self.read_frame(client), OK + u'ខ្ញុំ'.encode('utf-8'))
+        client.close()
+        thread.join()
+        server.close()
+
+    def testUnixSocket(self):
+        import tempfile
+        path = os.path.join(tempfile.mkdtemp(), 'kfc.sock')
+        server = UnixServer(path)
+        threading.Thread(target=server.serve_forever, daemon=True).start()
+        try:
+            clients = [socket.socket(socket.AF_UNIX) for _ in range(3)]
+            for client in clients:
+                client.connect(path)
+                client.sendall(encode_frame(b'u' + self.UNICODE.encode('utf-8')))
+            for client in clients:
+                self.assertEqual(self.read_frame(client), OK + self.expected().encode('utf-8'))
+                client.close()
+        finally:
+            server.shutdown()
+            server.server_close()
+        self.assertFalse(os.path.exists(path))
+        # anything but a socket is left alone
+        with open(path, 'w'):
+            pass
+        with self.assertRaises(FileExistsError):
+            UnixServer(path)
+        self.assertTrue(os.path.exists(path))
+        os.unlink(path)
+        os.rmdir(os.path.dirname(path))
+
+    def testHttp(self):
+        from urllib.request import Request, urlopen
+        from urllib.error import HTTPError
+        from http.client import HTTPConnection
+        server = HttpServer(0)
+        threading.Thread(target=server.serve_forever, daemon=True).start()
+        url = 'http://127.0.0.1:%d/' % server.server_address[1]
+        try:
+            with urlopen(Request(url + UNICODE_TO_LIMON, self.UNICODE.encode('utf-8'))) as response:
+                self.assertEqual(response.read().decode('utf-8'), self.expected())
+            request = Request(url + LIMON_TO_UNICODE, json.dumps([u'´', u'']).encode('utf-8'),
+                              {'Content-Type': 'application/json'})
+            with urlopen(request) as response:
+                self.assertEqual(json.loads(response.read()), [u'ខ្ញុំ', u''])
+            with self.assertRaises(HTTPError):
+                urlopen(Request(url + 'other', b''))
+            for length, status in (('x', 400), ('-1', 400), (str(MAX_FRAME + 1), 413)):
+                connection = HTTPConnection('127.0.0.1', server.server_address[1])
+                connection.putrequest('POST', '/' + UNICODE_TO_LIMON)
+                connection.putheader('Content-Length', length)
+                connection.endheaders()
+                self.assertEqual(connection.getresponse().status, status)
+                connection.close()
+        finally:
+            server.shutdown()
+            server.server_close()
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,99 @@
+import io
+import unittest
+from .convert import UNICODE_TO_LIMON, LIMON_TO_UNICODE, get_direction
+from .limon_to_unicode import limon_to_unicode
+from .unicode_to_limon import unicode_to_limon
+
+
+# longest carry kept without a place to cut it
+MAX_CARRY = 262144
+
+
+def carry_over(carry, chunk, boundary, max_carry=MAX_CARRY):
+    """
+    join chunk to the carry of the previous chunks, return (text, carry): text ends on a cluster boundary and can
+    be converted now, carry is kept for the next chunk unless it grows past max_carry characters
+    """
+    text = carry + chunk if carry else chunk
+    # the carry holds no place to cut, only the new chunk and the character before it are scanned
+    cut = boundary(text, start=len(carry))
+    if not cut and len(text) > max_carry:
+        cut = len(text)
+    return text[:cut], text[cut:]
+
+
+def iter_convert(chunks, direction=UNICODE_TO_LIMON, cache=None, max_carry=MAX_CARRY):
+    """
+    Convert an iterable of text chunks, yielding converted chunks.
+    The clusters left incomplete at the end of a chunk are carried over to the next one,
+    so the joined output is the same as the conversion of the joined input.
+    A carry growing past max_carry characters without a place to cut it, such as a long run of stray vowels,
+    is converted as it is, the output may differ from the conversion of the joined input there.
+    """
+    convert, boundary = get_direction(direction)
+    carry = ''
+    for chunk in chunks:
+        if not chunk:
+            continue
+        text, carry = carry_over(carry, chunk, boundary, max_carry)
+        if text:
+            yield convert(text, cache=cache)
+    if carry:
+        yield convert(carry, cache=cache)
+
+
+def convert_stream(reader, writer, direction=UNICODE_TO_LIMON, chunksize=65536, cache=None):
+    """
+    Convert everything read from the text file object reader and write it to writer,
+    holding no more than a few chunks in memory. Return the number of characters written.
+    """
+    chunks = iter(lambda: reader.read(chunksize), '')
+    written = 0
+    for converted in iter_convert(chunks, direction, cache=cache, max_carry=4 * chunksize):
+        written += writer.write(converted)
+    return written
+
+
+class TestStream(unittest.TestCase):
+
+    UNICODE = u'ថ្ងៃខែឆ្នាំកំណើត ខ្ញុំ កញ្ច្រៀវ ស្ត្រី ប្រាំ, ប៉ៅ នុ៎ះ អ៊ុំ ម៉្ងៃ នំប៉័ង។ welcome ' * 3
+
+    def testChunkBoundaries(self):
+        limon = unicode_to_limon(self.UNICODE)
+        for size in range(1, 12):
+            chunks = [self.UNICODE[i:i + size] for i in range(0, len(self.UNICODE), size)]
+            self.assertEqual(''.join(iter_convert(chunks)), limon)
+            chunks = [limon[i:i + size] for i in range(0, len(limon), size)]
+            self.assertEqual(''.join(iter_convert(chunks, LIMON_TO_UNICODE)), limon_to_unicode(limon))
+
+    def testConvertStream(self):
+        writer = io.StringIO()
+        convert_stream(io.StringIO(self.UNICODE), writer, chunksize=7)
+        self.assertEqual(writer.getvalue(), unicode_to_limon(self.UNICODE))
+
+    def testMaxCarry(self):
+        # stray vowels and leading limon vowels never end a cluster
+        for direction, text in ((UNICODE_TO_LIMON, u'ា' * 1000), (LIMON_TO_UNICODE, u'e' * 1000)):
+            chunks = [text[i:i + 10] for i in range(0, len(text), 10)]
+            converted = list(iter_convert(chunks, direction, max_carry=40))
+            self.assertGreater(len(converted), 10)
+            self.assertEqual(''.join(converted), get_direction(direction)[0](text))
+
+    def testLongCarry(self):
+        import time
+        elapsed = []
+        for count in (30000, 120000):
+            chunks = [u'ា' * 64] * (count // 64)
+            start = time.perf_counter()
+            list(iter_convert(chunks, max_carry=count))
+            elapsed.append(time.perf_counter() - start)
+        # linear time takes about 4 times longer, quadratic 16
+        self.assertLess(elapsed[1], 8 * elapsed[0] + 0.05)
+
+    def testUnknownDirection(self):
+        with self.assertRaises(ValueError):
+            list(iter_convert([u'ក'], 'limon_to_abc'))
+
+
+if __name__ == '__main__':
+    unittest.main()
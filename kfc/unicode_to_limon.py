@@ -1,148 +1,190 @@
 import re
+import time
+import unittest
+from . import backend, instrument
+from .engine import get_engine
 from .utils import legacy_reorder
+from .utils.alignment import Alignment
+from .utils.cache import ConversionCache, convert_words
+from .utils.normalization import normalize as normalize_text, normalize_reorder
+from .fonts import DEFAULT_FONT, get_font
 
 
-def unicode_to_limon(text):
-    """ convert a string in unicode format to limon """
-    text = re.sub(r"ញ្ញ", "BaØ", text)
-    text = re.sub(r'ខ្ញុំ', '´', text)
-    text = re.sub(r'ឫ', 'ប£', text)
-    text = re.sub(r'ឬ', 'ប¤', text)
-    text = re.sub(r'ឭ', 'ព£', text)
-    text = re.sub(r'ឮ', 'ព¤', text)
-    text = re.sub(r'ឰ', 'ព្ធ', text)
-    text = re.sub(r'៊ី', 'uI', text)
-    #
-    text = legacy_reorder.reorder(text)
-    #
-    text = re.sub(r'្ក', 'á', text)
-    text = re.sub(r'្ខ', 'ç', text)
-    text = re.sub(r'្គ', 'Á',  text)
-    text = re.sub(r'្ឃ', 'Ç', text)
-    text = re.sub(r'្ង', '¶',  text)
-    text = re.sub(r'្ច', '©',  text)
-    text = re.sub(r'្ឆ', 'ä',  text)
-    text = re.sub(r'្ជ', '¢',  text)
-    text = re.sub(r'្ឈ', 'Ä',  text)
-    text = re.sub(r'្ញ', 'J',  text)
-    text = re.sub(r'្ដ', 'þ', text)
-    text = re.sub(r'្ថ', 'ß', text)
-    text = re.sub(r'្ឌ', 'Ð', text)
-    text = re.sub(r'្ធ', '§', text)
-    text = re.sub(r'្ន', 'ñ', text)
-    text = re.sub(r'្ត', 'þ', text)
-    text = re.sub(r'្ឋ', 'æ', text)
-    text = re.sub(r'្ទ', 'Þ', text)
-    text = re.sub(r'្ឍ', 'Æ', text)
-    text = re.sub(r'្ណ', 'Ñ', text)
-    text = re.sub(r'្ប', ',', text)
-    text = re.sub(r'្ផ', 'ö',  text)
-    text = re.sub(r'្ព', '<',  text)
-    text = re.sub(r'្ភ', 'Ö',  text)
-    text = re.sub(r'្ម', 'µ',  text)
-    text = re.sub(r'្យ', 'ü',  text)
-    text = re.sub(r'្រ', 'R',  text)
-    text = re.sub(r'្ល', 'ø',  text)
-    text = re.sub(r'្វ', 'V',  text)
-    text = re.sub(r'្ស', 'S',  text)
-    text = re.sub(r'្ហ', 'ð',  text)
-    text = re.sub(r'្អ', '¥',  text)
-    #
-    text = re.sub(r"ក", "k", text)
-    text = re.sub(r"ខ", "x", text)
-    text = re.sub(r"គ", "K", text)
-    text = re.sub(r"ឃ", "X", text)
-    text = re.sub(r"ង", "g", text)
-    text = re.sub(r"ច", "c", text)
-    text = re.sub(r"ឆ", "q", text)
-    text = re.sub(r"ជ", "C", text)
-    text = re.sub(r"ឈ", "Q", text)
-    text = re.sub(r"ញ", "j", text)
-    text = re.sub(r"ដ", "d", text)
-    text = re.sub(r"ឋ", "z", text)
-    text = re.sub(r"ឌ", "D", text)
-    text = re.sub(r"ឍ", "Z", text)
-    text = re.sub(r"ណ", "N", text)
-    text = re.sub(r"ត", "t", text)
-    text = re.sub(r"ថ", "f", text)
-    text = re.sub(r"ទ", "T", text)
-    text = re.sub(r"ធ", "F", text)
-    text = re.sub(r"ន", "n", text)
-    text = re.sub(r"ប", "b", text)
-    text = re.sub(r"ផ", "p", text)
-    text = re.sub(r"ព", "B", text)
-    text = re.sub(r"ភ", "P", text)
-    text = re.sub(r"ម", "m", text)
-    text = re.sub(r"យ", "y", text)
-    text = re.sub(r"រ", "r", text)
-    text = re.sub(r"ល", "l", text)
-    text = re.sub(r"វ", "v", text)
-    text = re.sub(r"ស", "s", text)
-    text = re.sub(r"ហ", "h", text)
-    text = re.sub(r"ឡ", "L", text)
-    text = re.sub(r"អ", "G", text)
-    #
-    text = re.sub(r"១", "1", text)
-    text = re.sub(r"២", "2", text)
-    text = re.sub(r"៣", "3", text)
-    text = re.sub(r"៤", "4", text)
-    text = re.sub(r"៥", "5", text)
-    text = re.sub(r"៦", "6", text)
-    text = re.sub(r"៧", "7", text)
-    text = re.sub(r"៨", "8", text)
-    text = re.sub(r"៩", "9", text)
-    text = re.sub(r"០", "0", text)
-    #
-    text = re.sub(r'ា', 'a',  text)
-    text = re.sub(r'ិ', 'i',  text)
-    text = re.sub(r'ី', 'I',  text)
-    text = re.sub(r'ឹ', 'w',  text)
-    text = re.sub(r'ឺ', 'W',  text)
-    text = re.sub(r'ុ', 'u',  text)
-    text = re.sub(r'ូ', 'U',  text)
-    text = re.sub(r'ួ', 'Y',  text)
-    text = re.sub(r'ំ', 'M',  text)
-    text = re.sub(r'ះ', 'H',  text)
-    text = re.sub(r'េ', 'e',  text)
-    text = re.sub(r'ឿ', 'O', text)
-    text = re.sub(r'ៀ', 'o', text)
-    text = re.sub(r'ែ', 'E', text)
-    text = re.sub(r'ៃ', 'é', text)
-    text = re.sub(r'ៅ', 'A', text)
-    #
-    text = re.sub(r'ៈ', '³',  text)
-    text = re.sub(r'់', ';',  text)
-    text = re.sub(r'ៗ', '²',  text)
-    text = re.sub(r'៊', '‘',  text)
-    text = re.sub(r'៉', ':',  text)
-    text = re.sub(r'័', '½', text)
-    text = re.sub(r'៏', '¾', text)
-    text = re.sub(r'៌', '’', text)
-    text = re.sub(r'៎', '+', text)
-    text = re.sub(r'៍', '_', text)
-    text = re.sub(r'ិ៍', '×', text)
-    text = re.sub(r'។', '.', text)
-    text = re.sub(r'\(', '¬', text)
-    text = re.sub(r'\)', '¦', text)
-    text = re.sub(r'\?', '?', text)
-    text = re.sub(r'«', '{', text)
-    text = re.sub(r'»', '}', text)
-    text = re.sub(r'%', '°', text)
-    text = re.sub(r'\.', '>', text)
-    text = re.sub(r',', r'/', text)
-    text = re.sub(r'/', '¼', text)
-    text = re.sub(r'=', '=', text)
-    text = re.sub(r'\+', '÷', text)
-    text = re.sub(r'-', '-', text)
-    text = re.sub(r'!', '¡', text)
-    text = re.sub(r'៛', '¹', text)
-    #
-    text = re.sub(r'ឥ', r'\\',  text)
-    text = re.sub(r'ឦ', '|',  text)
-    text = re.sub(r'ឧ', ']',  text)
-    text = re.sub(r'ឪ', '«',  text)
-    text = re.sub(r'ឯ', 'É',  text)
-    text = re.sub(r'ឱ', '»',  text)
-    # clean up
-    text = re.sub('\u17ea', '', text)
-    return text
+# khmer and khmer symbols, with the zero width characters found inside words
+KHMER_SPAN = re.compile('[\u1780-\u17ff\u19e0-\u19ff][\u1780-\u17ff\u19e0-\u19ff\u200b-\u200d]*')
+
+# what unicode_to_limon does with the text around khmer spans
+CONVERT = 'convert'
+COPY = 'copy'
+
+
+def unicode_to_limon(text, cache=None, font=DEFAULT_FONT, non_khmer=CONVERT, align=False, normalize=False):
+    """
+    convert a string in unicode format to limon, or to another legacy font registered in kfc.fonts
+    words are memoized in cache when a utils.cache.ConversionCache is given
+    non_khmer is CONVERT to map the whole string through the glyph tables, punctuation included,
+    COPY to convert the khmer spans only and copy the rest through, or a function applied to the text between spans
+    with align, return (limon, utils.alignment.Alignment) mapping the offsets of text to the offsets of limon
+    with normalize, messy input is put in canonical form by utils.normalization while it is converted
+    """
+    if align:
+        if cache is not None or non_khmer != CONVERT:
+            raise ValueError('align cannot be combined with cache or non_khmer')
+        return _aligned(text, get_font(font), normalize)
+    if cache is not None:
+        # words are cut at zero width spaces, which normalization may remove first
+        if normalize:
+            text = normalize_text(text)
+        return convert_words(lambda words: unicode_to_limon(words, font=font, non_khmer=non_khmer), text, cache)
+    font = get_font(font)
+    if non_khmer != CONVERT:
+        return _convert_spans(text, font, non_khmer, normalize)
+    return _convert(text, font, normalize)
+
+
+def khmer_spans(text):
+    """ yield the (start, end) offsets of the runs of khmer in text """
+    for match in KHMER_SPAN.finditer(text):
+        yield match.span()
+
+
+def _convert_spans(text, font, non_khmer, normalize=False):
+    """ convert the khmer spans of text, the text between them is copied or passed to non_khmer """
+    if non_khmer == COPY:
+        other = None
+    elif callable(non_khmer):
+        other = non_khmer
+    else:
+        raise ValueError('non_khmer must be %r, %r or a function, not %r' % (CONVERT, COPY, non_khmer))
+    spans = list(khmer_spans(text))
+    if not spans:
+        return text if other is None else other(text)
+
+    # spans never contain a line feed and a line feed always ends a cluster,
+    # so every span is converted in one call and split again
+    converted = _convert('\n'.join(text[start:end] for start, end in spans), font, normalize).split('\n')
+    parts = []
+    last = 0
+    for (start, end), span in zip(spans, converted):
+        if start > last:
+            parts.append(text[last:start] if other is None else other(text[last:start]))
+        parts.append(span)
+        last = end
+    if last < len(text):
+        parts.append(text[last:] if other is None else other(text[last:]))
+    return ''.join(parts)
+
+
+def _convert(text, font, normalize=False):
+    if instrument.enabled:
+        return _instrumented(normalize_text(text) if normalize else text, font)
+    return get_engine(font).unicode_to_limon(text, normalize)
+
+
+def _aligned(text, font, normalize=False):
+    """ convert text and compose the alignments of the three stages """
+    alignment = Alignment()
+    if normalize:
+        text = normalize_reorder(text, font.pre_reorder.translate, alignment)
+    else:
+        text = font.pre_reorder.translate(text, alignment)
+        reordered = Alignment()
+        text = legacy_reorder.reorder(text, reordered)
+        alignment = alignment.compose(reordered)
+    mapped = Alignment()
+    text = font.glyphs.translate(text, mapped)
+    return text, alignment.compose(mapped)
+
+
+def _instrumented(text, font):
+    """ unicode_to_limon reporting its stage timings and counters to kfc.instrument """
+    clock = time.perf_counter
+    stats = instrument.ConversionStats()
+    start = clock()
+    substituted = font.pre_reorder.translate(text)
+    reordered_at = clock()
+    reordered = backend.reorder(substituted)
+    mapped_at = clock()
+    result = font.glyphs.translate(reordered)
+    end = clock()
+
+    stats.calls = 1
+    stats.chars = len(text)
+    stats.seconds['pre_reorder'] = reordered_at - start
+    stats.seconds['reorder'] = mapped_at - reordered_at
+    stats.seconds['glyphs'] = end - mapped_at
+    stats.clusters, stats.dotcircle_clusters = legacy_reorder.cluster_stats(substituted)
+    stats.marks = reordered.count(legacy_reorder.MARK) - substituted.count(legacy_reorder.MARK)
+    stats.unmapped = instrument.count_unmapped(result)
+    instrument.emit(stats)
+    return result
+
+
+class TestUnicodeToLimon(unittest.TestCase):
+
+    def testConversion(self):
+        self.assertEqual(unicode_to_limon(u'ថ្ងៃខែឆ្នាំកំណើត'), u'éf¶ExqñaMkMeNIt')
+        self.assertEqual(unicode_to_limon(u'ខ្ញុំ'), u'´')
+        self.assertEqual(unicode_to_limon(u'ព្រះ'), u'RBH')
+        self.assertEqual(unicode_to_limon(u'welcome'), u'welcome')
+
+    def testNoChainedRewrite(self):
+        # replaced text is never matched again
+        self.assertEqual(unicode_to_limon(u','), u'/')
+        self.assertEqual(unicode_to_limon(u'/'), u'¼')
+        self.assertEqual(unicode_to_limon(u'ក្ប'), u'k,')
+        self.assertEqual(unicode_to_limon(u'។'), u'.')
+        self.assertEqual(unicode_to_limon(u'នុ៎ះ'), u'nu+H')
+
+    def testCache(self):
+        cache = ConversionCache(maxsize=2)
+        text = u'ខ្ញុំ ទៅ សាលា ខ្ញុំ'
+        self.assertEqual(unicode_to_limon(text, cache=cache), unicode_to_limon(text))
+        self.assertEqual(cache.stats(), {'hits': 0, 'misses': 3, 'evictions': 1, 'size': 2, 'maxsize': 2})
+
+    def testLongestMatch(self):
+        self.assertEqual(unicode_to_limon(u'សិ៍'), u's×')
+        self.assertEqual(unicode_to_limon(u'សិ'), u'si')
+
+    def testAlign(self):
+        text = u'ថ្ងៃ ក្រុម, ខ្ញុំ'
+        limon, alignment = unicode_to_limon(text, align=True)
+        self.assertEqual(limon, unicode_to_limon(text))
+        self.assertEqual(limon, u'éf¶ Rkum/ ´')
+        # the coeng RO moved in front of its base stays in the unit of its cluster
+        self.assertEqual(alignment.to_target(6, 7), (4, 7))
+        self.assertEqual(alignment.to_target(5, 10), (4, 8))
+        self.assertEqual(alignment.to_source(8, 9), (10, 11))
+        self.assertEqual(alignment.to_source(10, 11), (12, 17))
+        self.assertEqual(alignment.to_target(0, len(text)), (0, len(limon)))
+        with self.assertRaises(ValueError):
+            unicode_to_limon(text, cache=ConversionCache(), align=True)
+
+    def testSpans(self):
+        text = u'see https://example.com/a,b (50%) ខ្ញុំ ទៅ សាលា។ ok!'
+        self.assertEqual(list(khmer_spans(text)), [(34, 39), (40, 42), (43, 48)])
+        self.assertEqual(unicode_to_limon(text, non_khmer=COPY), u'see https://example.com/a,b (50%) ´ eTA sala. ok!')
+        self.assertEqual(unicode_to_limon(text, non_khmer=str.upper), u'SEE HTTPS://EXAMPLE.COM/A,B (50%) ´ eTA sala. OK!')
+        plain = u'no khmer here, 100%.'
+        self.assertIs(unicode_to_limon(plain, non_khmer=COPY), plain)
+        self.assertEqual(unicode_to_limon(u'ថ្ងៃខែ\nឆ្នាំ', non_khmer=COPY), unicode_to_limon(u'ថ្ងៃខែ\nឆ្នាំ'))
+        cache = ConversionCache()
+        self.assertEqual(unicode_to_limon(text, cache=cache, non_khmer=COPY), unicode_to_limon(text, non_khmer=COPY))
+        with self.assertRaises(ValueError):
+            unicode_to_limon(text, non_khmer='drop')
+
+    def testNormalize(self):
+        messy = u'ថ្ងៃខែឆ្នាំំ កា្រ ស\u200bា គេា ok'
+        clean = u'ថ្ងៃខែឆ្នាំ ក្រា សា គោ ok'
+        self.assertEqual(unicode_to_limon(messy, normalize=True), unicode_to_limon(clean))
+        self.assertNotEqual(unicode_to_limon(messy), unicode_to_limon(clean))
+        self.assertEqual(unicode_to_limon(clean, normalize=True), unicode_to_limon(clean))
+        limon, alignment = unicode_to_limon(messy, align=True, normalize=True)
+        self.assertEqual(limon, unicode_to_limon(clean))
+        self.assertEqual(alignment.to_target(0, len(messy)), (0, len(limon)))
+        self.assertEqual(unicode_to_limon(messy, non_khmer=COPY, normalize=True), unicode_to_limon(clean, non_khmer=COPY))
+        self.assertEqual(unicode_to_limon(messy, cache=ConversionCache(), normalize=True), unicode_to_limon(clean))
+
+
+if __name__ == '__main__':
+    unittest.main()
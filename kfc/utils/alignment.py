@@ -0,0 +1,121 @@
+import unittest
+from array import array
+from bisect import bisect_left, bisect_right
+
+
+class Alignment:
+    """
+    Monotonic map between the offsets of a string and the offsets of its conversion.
+    Unit i covers source[i]:source[i + 1] and target[i]:target[i + 1], a unit is the smallest piece
+    converted as a whole: a character copied through, a table entry or a reordered cluster.
+    """
+
+    __slots__ = ('source', 'target')
+
+    def __init__(self, source=None, target=None):
+        self.source = array('i', [0]) if source is None else source
+        self.target = array('i', [0]) if target is None else target
+
+    def add(self, source_end, target_end):
+        """ close a unit at source_end and target_end """
+        if source_end != self.source[-1] or target_end != self.target[-1]:
+            self.source.append(source_end)
+            self.target.append(target_end)
+
+    def add_copy(self, source_end, target_end):
+        """ close one unit per character of a run copied through, source_end - target_end is the same for all """
+        start = self.source[-1]
+        if source_end > start:
+            self.source.extend(range(start + 1, source_end + 1))
+            self.target.extend(range(self.target[-1] + 1, target_end + 1))
+
+    def compose(self, other):
+        """ the alignment of self followed by other, whose source is the target of self """
+        source, target = array('i', [0]), array('i', [0])
+        middle, other_middle = self.target, other.source
+        i = j = 1
+        count, other_count = len(middle), len(other_middle)
+        while i < count and j < other_count:
+            if middle[i] < other_middle[j]:
+                i += 1
+            elif middle[i] > other_middle[j]:
+                j += 1
+            else:
+                # a boundary of both alignments is a boundary of the composition,
+                # units that are empty in the middle string are merged with the one before them
+                offset = middle[i]
+                while i + 1 < count and middle[i + 1] == offset:
+                    i += 1
+                while j + 1 < other_count and other_middle[j + 1] == offset:
+                    j += 1
+                source.append(self.source[i])
+                target.append(other.target[j])
+                i += 1
+                j += 1
+        return Alignment(source, target)
+
+    def inverse(self):
+        """ the alignment from the target back to the source """
+        return Alignment(self.target, self.source)
+
+    def to_target(self, start, end):
+        """ the span of the target converted from source[start:end], widened to whole units """
+        return _project(self.source, self.target, start, end)
+
+    def to_source(self, start, end):
+        """ the span of the source converted to target[start:end], widened to whole units """
+        return _project(self.target, self.source, start, end)
+
+    def __len__(self):
+        """ number of units """
+        return len(self.source) - 1
+
+    def __repr__(self):
+        return 'Alignment(%d units, %d -> %d)' % (len(self), self.source[-1], self.target[-1])
+
+
+def _project(offsets, other, start, end):
+    if not 0 <= start <= end <= offsets[-1]:
+        raise ValueError('span (%d, %d) out of range 0..%d' % (start, end, offsets[-1]))
+    first = bisect_right(offsets, start) - 1
+    if start == end:
+        return other[first], other[first]
+    return other[first], other[bisect_left(offsets, end)]
+
+
+class TestAlignment(unittest.TestCase):
+
+    def testProject(self):
+        # 'ab' copied, 'cde' -> 'X', 'f' dropped, 'g' copied
+        alignment = Alignment()
+        alignment.add_copy(2, 2)
+        alignment.add(5, 3)
+        alignment.add(6, 3)
+        alignment.add_copy(7, 4)
+        self.assertEqual(len(alignment), 5)
+        self.assertEqual(alignment.to_target(0, 2), (0, 2))
+        self.assertEqual(alignment.to_target(3, 4), (2, 3))
+        self.assertEqual(alignment.to_target(1, 7), (1, 4))
+        self.assertEqual(alignment.to_source(2, 3), (2, 5))
+        self.assertEqual(alignment.to_source(3, 4), (6, 7))
+        self.assertEqual(alignment.inverse().to_target(3, 4), (6, 7))
+        with self.assertRaises(ValueError):
+            alignment.to_target(0, 8)
+
+    def testCompose(self):
+        first = Alignment()
+        first.add(2, 1)
+        first.add_copy(4, 3)
+        second = Alignment()
+        second.add_copy(1, 1)
+        second.add(3, 2)
+        composed = first.compose(second)
+        self.assertEqual(list(composed.source), [0, 2, 4])
+        self.assertEqual(list(composed.target), [0, 1, 2])
+        # a character dropped at the end
+        first.add(5, 3)
+        self.assertEqual(list(first.compose(second).source), [0, 2, 5])
+
+
+if __name__ == '__main__':
+    unittest.main()
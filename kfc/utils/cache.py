@@ -0,0 +1,172 @@
+import re
+import threading
+import unittest
+from collections import OrderedDict
+
+
+# whitespace and zero width space never take part in a cluster, text can be cut around them
+_separators = re.compile('([\\s\u200b]+)')
+
+
+class _Stripe:
+    """ one independently locked part of a ConversionCache """
+
+    __slots__ = ('lock', 'data', 'maxsize', 'hits', 'misses', 'evictions')
+
+    def __init__(self, maxsize):
+        self.lock = threading.Lock()
+        self.data = OrderedDict()
+        self.maxsize = maxsize
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+
+class ConversionCache:
+    """
+    Bounded least recently used cache of converted words, safe to share between threads.
+    The keys are spread over stripes, each with its own lock and an equal share of maxsize, so threads
+    looking up different words rarely wait on each other. The order of use is kept per stripe.
+    The hits, misses and evictions counters can be read at any time.
+    A cache must only be used with one conversion function.
+    """
+
+    def __init__(self, maxsize=65536, stripes=1):
+        if maxsize <= 0:
+            raise ValueError('maxsize must be positive, got ' + str(maxsize))
+        if not 0 < stripes <= maxsize:
+            raise ValueError('stripes must be between 1 and maxsize, got ' + str(stripes))
+        self.maxsize = maxsize
+        self._stripes = [_Stripe(maxsize // stripes + (i < maxsize % stripes)) for i in range(stripes)]
+
+    def _stripe(self, key):
+        stripes = self._stripes
+        return stripes[hash(key) % len(stripes)] if len(stripes) > 1 else stripes[0]
+
+    @property
+    def hits(self):
+        return sum(stripe.hits for stripe in self._stripes)
+
+    @property
+    def misses(self):
+        return sum(stripe.misses for stripe in self._stripes)
+
+    @property
+    def evictions(self):
+        return sum(stripe.evictions for stripe in self._stripes)
+
+    def __len__(self):
+        return sum(len(stripe.data) for stripe in self._stripes)
+
+    def __contains__(self, key):
+        return key in self._stripe(key).data
+
+    def get(self, key, default=None):
+        """ look a key up and mark it as recently used """
+        stripe = self._stripe(key)
+        with stripe.lock:
+            try:
+                value = stripe.data[key]
+            except KeyError:
+                stripe.misses += 1
+                return default
+            stripe.data.move_to_end(key)
+            stripe.hits += 1
+            return value
+
+    def put(self, key, value):
+        """ store a value, evicting the least recently used one of its stripe when the stripe is full """
+        stripe = self._stripe(key)
+        with stripe.lock:
+            stripe.data[key] = value
+            stripe.data.move_to_end(key)
+            if len(stripe.data) > stripe.maxsize:
+                stripe.data.popitem(last=False)
+                stripe.evictions += 1
+
+    def clear(self):
+        """ drop every entry and reset the counters """
+        for stripe in self._stripes:
+            with stripe.lock:
+                stripe.data.clear()
+                stripe.hits = stripe.misses = stripe.evictions = 0
+
+    def stats(self):
+        """ return the counters as a dict """
+        return {
+            'hits': self.hits,
+            'misses': self.misses,
+            'evictions': self.evictions,
+            'size': len(self),
+            'maxsize': self.maxsize,
+        }
+
+
+def convert_words(function, text, cache):
+    """
+    Apply a cluster local conversion function word by word, looking every word up in the cache first.
+    The words missing from the cache are converted together in one call.
+    """
+    parts = _separators.split(text)
+    missing = {}
+    get = cache.get
+    for i in range(0, len(parts), 2):
+        word = parts[i]
+        if word in missing:
+            missing[word].append(i)
+        elif word:
+            value = get(word)
+            if value is None:
+                missing.setdefault(word, []).append(i)
+            else:
+                parts[i] = value
+
+    if missing:
+        words = list(missing)
+        converted = function(' '.join(words)).split(' ')
+        if len(converted) != len(words):
+            # the function does not keep spaces as they are, convert the words one by one
+            converted = [function(word) for word in words]
+        for word, value in zip(words, converted):
+            cache.put(word, value)
+            for i in missing[word]:
+                parts[i] = value
+    return ''.join(parts)
+
+
+class TestConversionCache(unittest.TestCase):
+
+    def testEviction(self):
+        cache = ConversionCache(maxsize=2)
+        cache.put('a', 'A')
+        cache.put('b', 'B')
+        self.assertEqual(cache.get('a'), 'A')
+        cache.put('c', 'C')
+        self.assertNotIn('b', cache)
+        self.assertEqual(cache.get('b'), None)
+        self.assertEqual(cache.stats(), {'hits': 1, 'misses': 1, 'evictions': 1, 'size': 2, 'maxsize': 2})
+
+    def testConvertWords(self):
+        cache = ConversionCache()
+        self.assertEqual(convert_words(str.upper, 'ab cd\u200bab\n', cache), 'AB CD\u200bAB\n')
+        self.assertEqual((cache.hits, cache.misses), (0, 2))
+        self.assertEqual(convert_words(str.upper, 'cd ab', cache), 'CD AB')
+        self.assertEqual((cache.hits, cache.misses), (2, 2))
+
+    def testStripes(self):
+        from concurrent.futures import ThreadPoolExecutor
+        cache = ConversionCache(maxsize=10, stripes=4)
+        words = [str(i) for i in range(100)]
+        with ThreadPoolExecutor(4) as executor:
+            list(executor.map(lambda word: cache.put(word, word.upper()), words))
+            list(executor.map(cache.get, words))
+        self.assertEqual(len(cache), 10)
+        self.assertEqual(cache.stats(), {'hits': 10, 'misses': 90, 'evictions': 90, 'size': 10, 'maxsize': 10})
+        cache.clear()
+        self.assertEqual(len(cache), 0)
+        with self.assertRaises(ValueError):
+            ConversionCache(maxsize=2, stripes=3)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -19,7 +19,10 @@
 #       Seth Chanratha (sethchanratha@khmeros.info)
 #
 # This module reorder unicode string accordding unicode order
+import re
+import threading
 import unittest
+from operator import itemgetter
 
 
 # important character to test in order to form a cluster
@@ -191,174 +194,530 @@ def getCharClass(uniChar):
     return 0
 
 
-def reorder(sin):
+# character class of every combining khmer character, any other character is _xx
+_charClasses = dict((chr(0x1780 + i), kChar) for i, kChar in enumerate(khmerCharClasses) if kChar != _xx)
+
+# khmerStateTable flattened, the next state is _stateTable[state * CC_COUNT + charClass]
+_stateTable = [state for row in khmerStateTable for state in row]
+
+# a run of characters that never combine into a cluster
+_reservedRun = re.compile('[^' + ''.join(_charClasses) + ']+')
+
+
+class Cluster(tuple):
     """
-    Given an input string of unicode cluster to reorder.
-    The return is the visual based cluster (legacy style) string.
+    A cluster found by iter_clusters, sin[start:end].
+    The parts are offsets into sin, -1 when the cluster has none: coeng1 and coeng2 are the subscript consonants,
+    each following its coeng, and coengOpen tells that the cluster ends with a coeng without one. A split vowel
+    is both vowelBefore and vowelAbove or vowelAfter. reserved is True for a run of characters that do not combine.
     """
-    # if (type(sin) != unicode):
-    #     raise TypeError('only accept unicode string')
 
-    cursor = 0
-    state = 0
+    __slots__ = ()
+
+    _fields = ('start', 'end', 'reserved', 'base', 'coeng1', 'coeng2', 'coengOpen', 'shifter', 'shifterAfterCoeng',
+               'robat', 'vowelBefore', 'vowelBelow', 'vowelAbove', 'vowelAfter', 'signAbove', 'signAfter')
+
+    def __new__(cls, start, end, reserved=False, base=-1, coeng1=-1, coeng2=-1, coengOpen=False, shifter=-1,
+                shifterAfterCoeng=False, robat=-1, vowelBefore=-1, vowelBelow=-1, vowelAbove=-1, vowelAfter=-1,
+                signAbove=-1, signAfter=-1):
+        return tuple.__new__(cls, (start, end, reserved, base, coeng1, coeng2, coengOpen, shifter, shifterAfterCoeng,
+                                   robat, vowelBefore, vowelBelow, vowelAbove, vowelAfter, signAbove, signAfter))
+
+    def __repr__(self):
+        parts = ', '.join('%s=%r' % (name, value) for name, value in zip(self._fields[3:], self[3:])
+                          if value is not False and value != -1)
+        return 'Cluster(%d, %d%s%s)' % (self.start, self.end, ', reserved=True' if self.reserved else '',
+                                        ', ' + parts if parts else '')
+
+
+for _index, _name in enumerate(Cluster._fields):
+    setattr(Cluster, _name, property(itemgetter(_index)))
+del _index, _name
+
+_newCluster = tuple.__new__
+_reservedParts = (True, -1, -1, -1, False, -1, False, -1, -1, -1, -1, -1, -1, -1)
+
+
+def iter_clusters(sin):
+    """
+    Walk khmerStateTable over sin lazily and yield a Cluster for every cluster and every run of characters
+    that do not combine, in order. The clusters cover sin.
+    """
+    for parts in _scan(sin):
+        yield _newCluster(Cluster, parts)
+
+
+def _scan(sin):
+    """ iter_clusters yielding the parts of the clusters as plain tuples """
+    charClasses = _charClasses
+    stateTable = _stateTable
+    reservedRun = _reservedRun
     charCount = len(sin)
-    result = u''
+    cursor = 0
 
     while (cursor < charCount):
-        reserved = ''
-        signAbove = ''
-        signAfter = ''
-        base = ''
-        robat = ''
-        shifter = ''
-        vowelBefore = ''
-        vowelBelow = ''
-        vowelAbove = ''
-        vowelAfter = ''
+        if (sin[cursor] not in charClasses):
+            run = reservedRun.match(sin, cursor)
+            start = cursor
+            cursor = run.end()
+            yield (start, cursor) + _reservedParts
+            continue
+
+        start = cursor
+        signAbove = signAfter = base = robat = shifter = -1
+        vowelBefore = vowelBelow = vowelAbove = vowelAfter = -1
+        coeng1 = coeng2 = -1
         coeng = False
-        cluster = ''
-
-        coeng1 = ''
-        coeng2 = ''
-
         shifterAfterCoeng = False
+        state = 0
 
         while (cursor < charCount):
-
-            curChar = sin[cursor]
-            kChar = getCharClass(curChar)
-            charClass = kChar & CF_CLASS_MASK
-            state = khmerStateTable[state][charClass]
+            kChar = charClasses.get(sin[cursor], _xx)
+            state = stateTable[state * CC_COUNT + (kChar & CF_CLASS_MASK)]
             if (state < 0):
                 break
 
-            # collect variable for cluster here
-
-            if (kChar == _xx):
-                reserved = curChar
-            elif (kChar == _sa):        # Sign placed above the base
-                signAbove = curChar
-            elif (kChar == _sp):        # Sign placed after the base
-                signAfter = curChar
-            elif (kChar == _c1) or (kChar == _c2) or (kChar == _c3):    # Consonant
+            if (kChar & CF_CONSONANT):      # Consonant
                 if (coeng):
-                    if (not coeng1):
-                        coeng1 = COENG + curChar
+                    if (coeng1 < 0):
+                        coeng1 = cursor
                     else:
-                        coeng2 = COENG + curChar
+                        coeng2 = cursor
                     coeng = False
                 else:
-                    base = curChar
-            elif (kChar == _rb):            # Khmer sign robat u17CC
-                robat = curChar
-            elif (kChar == _cs):            # Consonant-shifter
-                if (coeng1):
-                    shifterAfterCoeng = True
-                shifter = curChar
-            elif (kChar == _dl):            # Dependent vowel placed before the base
-                vowelBefore = curChar
-            elif (kChar == _db):            # Dependent vowel placed below the base
-                vowelBelow = curChar
-            elif (kChar == _da):            # Dependent vowel placed above the base
-                vowelAbove = curChar
+                    base = cursor
+            elif (kChar == _sa):            # Sign placed above the base
+                signAbove = cursor
             elif (kChar == _dr):            # Dependent vowel placed behind the base
-                vowelAfter = curChar
+                vowelAfter = cursor
+            elif (kChar == _da):            # Dependent vowel placed above the base
+                vowelAbove = cursor
+            elif (kChar == _db):            # Dependent vowel placed below the base
+                vowelBelow = cursor
             elif (kChar == _co):            # Khmer combining mark COENG
                 coeng = True
+            elif (kChar == _dl):            # Dependent vowel placed before the base
+                vowelBefore = cursor
+            elif (kChar == _sp):            # Sign placed after the base
+                signAfter = cursor
+            elif (kChar == _cs):            # Consonant-shifter
+                if (coeng1 >= 0):
+                    shifterAfterCoeng = True
+                shifter = cursor
             elif (kChar == _va):            # Khmer split vowel, see _da
-                vowelBefore = SRAE
-                vowelAbove = sraEcombining[curChar]
+                vowelBefore = cursor
+                vowelAbove = cursor
             elif (kChar == _vr):            # Khmer split vowel, see _dr
-                vowelBefore = SRAE
-                vowelAfter = sraEcombining[curChar]
+                vowelBefore = cursor
+                vowelAfter = cursor
+            elif (kChar == _rb):            # Khmer sign robat u17CC
+                robat = cursor
 
             cursor += 1
         # end of while (a cluster has found)
 
-        # logic of vowel
-        # determine if right side vowel should be marked
-        if (coeng1 and vowelBelow):
-            vowelBelow = MARK + vowelBelow
-        elif ((base == LA or base == NYO) and vowelBelow):
-            vowelBelow = MARK + vowelBelow
-        elif (coeng1 and vowelBefore and vowelAfter):
-            vowelAfter = MARK + vowelAfter
-
-        # logic when cluster has coeng
-        # should coeng be located on left side
-        coengBefore = ''
-        if (coeng1 == CORO):
-            coengBefore = coeng1
-            coeng1 = ''
-        elif (coeng2 == CORO):
-            coengBefore = MARK + coeng2
-            coeng2 = ''
-        if (coeng1 or coeng2):
-            # NYO must change to other form when there is coeng
-            if (base == NYO):
-                base = MARK + base
-                # coeng NYO must be marked
-                if (coeng1 == CONYO):
-                    coeng1 = MARK + coeng1
-
-            if (coeng1 and coeng2):
-                coeng2 = MARK + coeng2
-
-        # logic of shifter with base character
-        if (base and shifter):
-            # special case apply to BA only
-            if (vowelAbove) and (base == BA) and (shifter == TRIISAP):
-                vowelAbove = MARK + vowelAbove
-            elif (vowelAbove):
-                shifter = MARK + shifter
-            elif (signAbove == SAMYOKSANNYA) and (shifter == MUUSIKATOAN):
-                shifter = MARK + shifter
-            elif (signAbove and vowelAfter):
-                shifter = MARK + shifter
-            elif (signAbove):
-                signAbove = MARK + signAbove
-            # add another mark to shifter
-            if (coeng1) and (vowelAbove or signAbove):
-                shifter = MARK + shifter
-            if (base == LA or base == NYO):
-                shifter = MARK + shifter
-
-        # uncomplete coeng
-        if (coeng and not coeng1):
-            coeng1 = COENG
-        elif (coeng and not coeng2):
-            coeng2 = MARK + COENG
-
-        # render DOTCIRCLE for standalone sign or vowel
-        if (not base) and (vowelBefore or coengBefore or robat or shifter or coeng1 or coeng2 or vowelAfter or vowelBelow or vowelAbove or signAbove or signAfter):
-            base = DOTCIRCLE
-
-        # place of shifter
-        shifter1 = ''
-        shifter2 = ''
-        if (shifterAfterCoeng):
-            shifter2 = shifter
-        else:
-            shifter1 = shifter
-
-        specialCaseBA = False
-        if (base == BA) and ((vowelAfter == SRAAA) or (vowelAfter == SRAAU) or (vowelAfter == MARK + SRAAA) or (vowelAfter == MARK + SRAAU)):
-            # SRAAA or SRAAU will get a MARK if there is coeng, redefine to last char
-            vowelAfter = vowelAfter[-1]
-            specialCaseBA = True
-            if (coeng1) and (coeng1[-1] in [BA, YO, SA]):
-                specialCaseBA = False
-
-        # cluster formation
-        if (specialCaseBA):
-            cluster = vowelBefore + coengBefore + base + vowelAfter + robat + shifter1 + coeng1 + coeng2 + shifter2 + vowelBelow + vowelAbove + signAbove + signAfter
+        yield (start, cursor, False, base, coeng1, coeng2, coeng, shifter, shifterAfterCoeng, robat,
+               vowelBefore, vowelBelow, vowelAbove, vowelAfter, signAbove, signAfter)
+
+
+# visual string of the clusters seen so far, by their characters, one dict per thread
+_local = threading.local()
+_RENDERED_MAX = 65536
+
+
+def reorder(sin, alignment=None):
+    """
+    Given an input string of unicode cluster to reorder.
+    The return is the visual based cluster (legacy style) string.
+    The offsets of every cluster and copied character are added to alignment when one is given.
+    """
+    try:
+        rendered = _local.rendered
+    except AttributeError:
+        rendered = _local.rendered = {}
+    result = []
+    append = result.append
+    written = 0
+
+    for cluster in _scan(sin):
+        text = sin[cluster[0]:cluster[1]]
+        if (cluster[2]):
+            # characters that do not combine are copied through as they are
+            append(text)
+            if (alignment is not None):
+                written += len(text)
+                alignment.add_copy(cluster[1], written)
+            continue
+        # the rendering of a cluster only depends on its characters
+        visual = rendered.get(text)
+        if (visual is None):
+            visual = _renderCluster(sin, cluster)
+            if (len(rendered) < _RENDERED_MAX):
+                rendered[text] = visual
+        append(visual)
+        if (alignment is not None):
+            written += len(visual)
+            alignment.add(cluster[1], written)
+    return ''.join(result)
+
+
+def _renderCluster(sin, cluster):
+    """ the visual based (legacy style) string of a cluster of sin """
+    (start, end, reserved, base, coeng1, coeng2, coeng, shifter, shifterAfterCoeng, robat,
+     vowelBefore, vowelBelow, vowelAbove, vowelAfter, signAbove, signAfter) = cluster
+    base = sin[base] if (base >= 0) else ''
+    coeng1 = COENG + sin[coeng1] if (coeng1 >= 0) else ''
+    coeng2 = COENG + sin[coeng2] if (coeng2 >= 0) else ''
+    shifter = sin[shifter] if (shifter >= 0) else ''
+    robat = sin[robat] if (robat >= 0) else ''
+    signAbove = sin[signAbove] if (signAbove >= 0) else ''
+    signAfter = sin[signAfter] if (signAfter >= 0) else ''
+    vowelBelow = sin[vowelBelow] if (vowelBelow >= 0) else ''
+    if (vowelBefore >= 0):
+        if (vowelBefore == vowelAbove):
+            # a split vowel is written as SRAE before the base and its second part
+            vowelAbove = sraEcombining[sin[vowelBefore]]
+            vowelAfter = ''
+            vowelBefore = SRAE
+        elif (vowelBefore == vowelAfter):
+            vowelAfter = sraEcombining[sin[vowelBefore]]
+            vowelAbove = ''
+            vowelBefore = SRAE
         else:
-            cluster = vowelBefore + coengBefore + base + robat + shifter1 + coeng1 + coeng2 + shifter2 + vowelBelow + vowelAbove + vowelAfter + signAbove + signAfter
+            vowelBefore = sin[vowelBefore]
+            vowelAbove = vowelAfter = ''
+    else:
+        vowelBefore = ''
+        vowelAbove = sin[vowelAbove] if (vowelAbove >= 0) else ''
+        vowelAfter = sin[vowelAfter] if (vowelAfter >= 0) else ''
+
+    # logic of vowel
+    # determine if right side vowel should be marked
+    if (coeng1 and vowelBelow):
+        vowelBelow = MARK + vowelBelow
+    elif ((base == LA or base == NYO) and vowelBelow):
+        vowelBelow = MARK + vowelBelow
+    elif (coeng1 and vowelBefore and vowelAfter):
+        vowelAfter = MARK + vowelAfter
+
+    # logic when cluster has coeng
+    # should coeng be located on left side
+    coengBefore = ''
+    if (coeng1 == CORO):
+        coengBefore = coeng1
+        coeng1 = ''
+    elif (coeng2 == CORO):
+        coengBefore = MARK + coeng2
+        coeng2 = ''
+    if (coeng1 or coeng2):
+        # NYO must change to other form when there is coeng
+        if (base == NYO):
+            base = MARK + base
+            # coeng NYO must be marked
+            if (coeng1 == CONYO):
+                coeng1 = MARK + coeng1
+
+        if (coeng1 and coeng2):
+            coeng2 = MARK + coeng2
+
+    # logic of shifter with base character
+    if (base and shifter):
+        # special case apply to BA only
+        if (vowelAbove) and (base == BA) and (shifter == TRIISAP):
+            vowelAbove = MARK + vowelAbove
+        elif (vowelAbove):
+            shifter = MARK + shifter
+        elif (signAbove == SAMYOKSANNYA) and (shifter == MUUSIKATOAN):
+            shifter = MARK + shifter
+        elif (signAbove and vowelAfter):
+            shifter = MARK + shifter
+        elif (signAbove):
+            signAbove = MARK + signAbove
+        # add another mark to shifter
+        if (coeng1) and (vowelAbove or signAbove):
+            shifter = MARK + shifter
+        if (base == LA or base == NYO):
+            shifter = MARK + shifter
+
+    # uncomplete coeng
+    if (coeng and not coeng1):
+        coeng1 = COENG
+    elif (coeng and not coeng2):
+        coeng2 = MARK + COENG
+
+    # render DOTCIRCLE for standalone sign or vowel, a cluster without base always has one
+    if (not base):
+        base = DOTCIRCLE
+
+    # place of shifter
+    shifter1 = ''
+    shifter2 = ''
+    if (shifterAfterCoeng):
+        shifter2 = shifter
+    else:
+        shifter1 = shifter
+
+    specialCaseBA = False
+    if (base == BA) and ((vowelAfter == SRAAA) or (vowelAfter == SRAAU) or (vowelAfter == MARK + SRAAA) or (vowelAfter == MARK + SRAAU)):
+        # SRAAA or SRAAU will get a MARK if there is coeng, redefine to last char
+        vowelAfter = vowelAfter[-1]
+        specialCaseBA = True
+        if (coeng1) and (coeng1[-1] in [BA, YO, SA]):
+            specialCaseBA = False
+
+    # cluster formation
+    if (specialCaseBA):
+        return vowelBefore + coengBefore + base + vowelAfter + robat + shifter1 + coeng1 + coeng2 + shifter2 + vowelBelow + vowelAbove + signAbove + signAfter
+    return vowelBefore + coengBefore + base + robat + shifter1 + coeng1 + coeng2 + shifter2 + vowelBelow + vowelAbove + vowelAfter + signAbove + signAfter
+
+
+def cluster_stats(sin):
+    """
+    Walk khmerStateTable over sin without building any output.
+    Return the number of khmer clusters and how many of them have no base, those that reorder renders
+    with DOTCIRCLE. Only the first character of a cluster can be its base.
+    """
+    charClasses = _charClasses
+    stateTable = _stateTable
+    clusters = 0
+    baseless = 0
+    state = -1
+    for curChar in sin:
+        kChar = charClasses.get(curChar, _xx)
+        if (state >= 0):
+            state = stateTable[state * CC_COUNT + (kChar & CF_CLASS_MASK)]
+            if (state >= 0):
+                continue
+        if (kChar != _xx):
+            clusters += 1
+            if (not kChar & CF_CONSONANT):
+                baseless += 1
+            state = stateTable[kChar & CF_CLASS_MASK]
+    return clusters, baseless
+
+
+def _wellFormedPattern():
+    """
+    khmerStateTable unrolled into a regular expression of the clusters reorder renders with a base and every coeng
+    followed by its consonant. The table has no cycle, so the states are expanded into nested groups, keyed by the
+    state and whether a coeng is still waiting for its consonant. Like the state machine, a cluster only ends where
+    the next character cannot continue it.
+    """
+    memo = {}
+
+    def after(state, coeng):
+        key = (state, coeng)
+        if key not in memo:
+            targets = {}
+            for char, kChar in _charClasses.items():
+                next = _stateTable[state * CC_COUNT + (kChar & CF_CLASS_MASK)]
+                if (next >= 0):
+                    if (kChar & CF_CONSONANT):
+                        nextCoeng = False
+                    else:
+                        nextCoeng = coeng or (kChar == _co)
+                    targets.setdefault((next, nextCoeng), []).append(char)
+            alternatives = ['[%s]%s' % (''.join(chars), after(*target)) for target, chars in sorted(targets.items())]
+            if not coeng:
+                # the cluster can end here, unless the next character continues it
+                alternatives.append('(?![%s])' % ''.join(char for chars in targets.values() for char in chars)
+                                    if targets else '')
+            memo[key] = '(?:%s)' % '|'.join(alternatives) if alternatives else '(?!)'
+        return memo[key]
+
+    # a cluster starts with its base
+    bases = {}
+    for char, kChar in _charClasses.items():
+        if (kChar & CF_CONSONANT):
+            bases.setdefault(_stateTable[kChar & CF_CLASS_MASK], []).append(char)
+    clusters = ['[%s]%s' % (''.join(chars), after(state, False)) for state, chars in sorted(bases.items())]
+    # a text splits into clusters and whole reserved runs in one way only, so a failed match has nothing to
+    # backtrack into
+    khmer = ''.join(_charClasses)
+    return '(?:%s|[^%s]+(?![^%s]))*' % ('|'.join(clusters), khmer, khmer)
+
+
+_wellFormed = re.compile(_wellFormedPattern())
+
+
+def is_well_formed(sin):
+    """
+    Return whether reorder renders every cluster of sin with its base and complete coengs,
+    no DOTCIRCLE and no incomplete coeng. The state machine is run by the regular expression engine.
+    """
+    return _wellFormed.fullmatch(sin) is not None
 
-        result += cluster + reserved
+
+def malformed_clusters(sin):
+    """
+    Return the (start, end) offsets of the clusters of sin that reorder renders with DOTCIRCLE
+    or an incomplete coeng. The well formed text between them is skipped by the regular expression engine.
+    """
+    charClasses = _charClasses
+    stateTable = _stateTable
+    charCount = len(sin)
+    offsets = []
+    cursor = _wellFormed.match(sin).end()
+    while (cursor < charCount):
+        start = cursor
+        kChar = charClasses[sin[cursor]]
+        baseless = not kChar & CF_CONSONANT
+        coeng = False
         state = 0
-    # end of while
-    return result
+        while (cursor < charCount):
+            kChar = charClasses.get(sin[cursor], _xx)
+            state = stateTable[state * CC_COUNT + (kChar & CF_CLASS_MASK)]
+            if (state < 0):
+                break
+            if (kChar & CF_CONSONANT):
+                coeng = False
+            elif (kChar == _co):
+                coeng = True
+            cursor += 1
+        if (baseless or coeng):
+            offsets.append((start, cursor))
+        # a cluster starting with a mark has no base, well formed text starts with a base or a reserved character
+        if (cursor < charCount) and (charClasses.get(sin[cursor], _c1) & CF_CONSONANT):
+            cursor = _wellFormed.match(sin, cursor).end()
+    return offsets
+
+
+def last_boundary(sin, start=0):
+    """
+    Return the index of the last character that always starts a new cluster, 0 if there is none.
+    khmerStateTable only reaches a consonant state from the ground state or after a coeng and every
+    other state rejects _xx, so sin[:index] and sin[index:] can be converted independently.
+    Only the indexes from start on are looked at.
+    """
+    charClasses = _charClasses
+    cursor = len(sin) - 1
+    stop = max(start, 1)
+    while (cursor >= stop):
+        kChar = charClasses.get(sin[cursor], _xx)
+        if (kChar == _xx) or ((kChar & CF_CONSONANT) and (sin[cursor - 1] != COENG)):
+            return cursor
+        cursor -= 1
+    return 0
+
+
+# split vowels recombined from SRAE and their second part
+sraEsplitting = dict((second, vowel) for vowel, second in sraEcombining.items())
+
+# order of the characters following the base in a logical (unicode) cluster
+_logicalRank = {
+    CC_ROBAT: 0,
+    CC_COENG: 1,
+    CC_CONSONANT_SHIFTER: 1,    # same as coeng, the visual order of the two is the logical one
+    CC_DEPENDENT_VOWEL: 4,
+    CC_SIGN_ABOVE: 5,
+    CC_SIGN_AFTER: 6,
+}
+
+
+def _restoreCluster(prefix, base, marks):
+    """
+    build a logical cluster from its visual parts, marks is a list of (rank, text)
+    prefix holds at most one vowel and one coeng RO, every part is placed with a single pass over marks
+    """
+    # (rank, order, text), a vowel of the prefix comes first among the vowels
+    parts = [(rank, i, text) for i, (rank, text) in enumerate(marks)]
+    for part in prefix:
+        if part == SRAE:
+            for i, (rank, order, text) in enumerate(parts):
+                if text in sraEsplitting:
+                    parts[i] = (rank, order, sraEsplitting[text])
+                    break
+            else:
+                parts.append((_logicalRank[CC_DEPENDENT_VOWEL], -1, part))
+        elif part == CORO:
+            # coeng RO is the last subscript
+            position = -1
+            for rank, order, text in parts:
+                if (order >= 0) and (text[0] == COENG):
+                    position = order
+            parts.append((_logicalRank[CC_COENG], position + 0.5, part))
+        else:
+            parts.append((_logicalRank[CC_DEPENDENT_VOWEL], -1, part))
+    parts.sort(key=itemgetter(0, 1))
+    return base + ''.join(text for rank, order, text in parts)
+
+
+def inverse_reorder(sin, alignment=None):
+    """
+    Given a visual based (legacy style) string, the inverse of reorder.
+    The return is the string in logical unicode order: vowels written before the base and coeng RO
+    are moved behind it and split vowels are recombined with SRAE.
+    The offsets of every cluster and copied character are added to alignment when one is given.
+    """
+    charClasses = _charClasses
+    result = []
+    prefix = []
+    base = ''
+    marks = []
+    cursor = 0
+    written = 0
+    charCount = len(sin)
+
+    while (cursor < charCount):
+        curChar = sin[cursor]
+        cursor += 1
+        if (curChar == MARK):
+            continue
+        kChar = charClasses.get(curChar, _xx)
+        charClass = kChar & CF_CLASS_MASK
+
+        if (charClass == CC_COENG):
+            if (cursor < charCount) and (charClasses.get(sin[cursor], _xx) & CF_CONSONANT):
+                curChar += sin[cursor]
+                cursor += 1
+            if (curChar == CORO):
+                # coeng RO is written on the left side of the base, a second one starts another cluster
+                if (base or marks or (CORO in prefix)):
+                    result.append(_restoreCluster(prefix, base, marks))
+                    if (alignment is not None):
+                        written += len(result[-1])
+                        alignment.add(cursor - len(curChar), written)
+                    prefix, base, marks = [], '', []
+                prefix.append(curChar)
+            else:
+                marks.append((_logicalRank[CC_COENG], curChar))
+        elif (kChar == _dl):
+            if (base or marks) or any((part != CORO) for part in prefix):
+                result.append(_restoreCluster(prefix, base, marks))
+                if (alignment is not None):
+                    written += len(result[-1])
+                    alignment.add(cursor - len(curChar), written)
+                prefix, base, marks = [], '', []
+            prefix.append(curChar)
+        elif (kChar & CF_CONSONANT):
+            if (base or marks):
+                result.append(_restoreCluster(prefix, base, marks))
+                if (alignment is not None):
+                    written += len(result[-1])
+                    alignment.add(cursor - len(curChar), written)
+                prefix, marks = [], []
+            base = curChar
+        elif (charClass in _logicalRank):
+            marks.append((_logicalRank[charClass], curChar))
+        else:
+            if (prefix or base or marks):
+                result.append(_restoreCluster(prefix, base, marks))
+                if (alignment is not None):
+                    written += len(result[-1])
+                    alignment.add(cursor - len(curChar), written)
+                prefix, base, marks = [], '', []
+            result.append(curChar)
+            if (alignment is not None):
+                written += len(curChar)
+                alignment.add(cursor, written)
+
+    if (prefix or base or marks):
+        result.append(_restoreCluster(prefix, base, marks))
+        if (alignment is not None):
+            alignment.add(charCount, written + len(result[-1]))
+    elif (alignment is not None):
+        alignment.add(charCount, written)
+    return ''.join(result)
 
 
 class TestReordering(unittest.TestCase):
@@ -472,6 +831,64 @@ class TestReordering(unittest.TestCase):
         # this is two cluster
         self.assertEqual(reorder(u'ាក'), DOTCIRCLE + u'ាក')
 
+    def testClusterStats(self):
+        self.assertEqual(cluster_stats(u'កាប់គោ'), (3, 0))
+        self.assertEqual(cluster_stats(u'កកុះwelcomeកុម្ភៈ'), (4, 0))
+        self.assertEqual(cluster_stats(u'ាក'), (2, 1))
+        self.assertEqual(cluster_stats(u'ំះ័'), (3, 3))
+        self.assertEqual(cluster_stats(u''), (0, 0))
+
+    def testIterClusters(self):
+        text = u'ស្ត្រី, ប៉ៅ ោ'
+        clusters = list(iter_clusters(text))
+        self.assertEqual([(cluster.start, cluster.end, cluster.reserved) for cluster in clusters],
+                         [(0, 6, False), (6, 8, True), (8, 11, False), (11, 12, True), (12, 13, False)])
+        self.assertEqual(clusters[0], Cluster(0, 6, base=0, coeng1=2, coeng2=4, vowelAbove=5))
+        # a split vowel is before the base and after it
+        self.assertEqual((clusters[2].shifter, clusters[2].vowelBefore, clusters[2].vowelAfter), (9, 10, 10))
+        self.assertEqual(clusters[4].base, -1)
+        self.assertEqual(repr(clusters[1]), 'Cluster(6, 8, reserved=True)')
+        self.assertEqual(list(iter_clusters(u'')), [])
+        self.assertEqual(cluster_stats(text), (3, 1))
+
+    def testWellFormed(self):
+        text = u'ថ្ងៃខែឆ្នាំកំណើត ខ្ញុំ កញ្ច្រៀវ ស្ត្រី ប្រាំ, ប៉ៅ នុ៎ះ អ៊ុំ ម៉្ងៃ នំប៉័ង។ welcome'
+        self.assertTrue(is_well_formed(text))
+        self.assertTrue(is_well_formed(u''))
+        self.assertEqual(malformed_clusters(text), [])
+        # a vowel without base, a coeng without consonant, a repeated vowel and a coeng followed by a vowel
+        self.assertFalse(is_well_formed(u'ា'))
+        self.assertEqual(malformed_clusters(u'ក ាខ្ ក្'), [(2, 3), (3, 5), (6, 8)])
+        self.assertEqual(malformed_clusters(u'កាា ក្ា'), [(2, 3), (4, 6), (6, 7)])
+        for cluster in malformed_clusters(u'កាា ស្ត្រី ្ក ខ្ញុំ'):
+            self.assertFalse(is_well_formed(u'កាា ស្ត្រី ្ក ខ្ញុំ'[slice(*cluster)]))
+
+    def testInverseRuns(self):
+        import time
+        # every repeated vowel before the base or coeng RO starts a cluster of its own
+        self.assertEqual(inverse_reorder(SRAE * 3 + u'ក'), SRAE * 2 + u'កេ')
+        self.assertEqual(inverse_reorder(CORO * 2 + u'ក'), CORO + u'ក្រ')
+        self.assertEqual(inverse_reorder(SRAE + CORO + u'ក'), u'ក្រេ')
+        elapsed = []
+        for count in (20000, 80000):
+            start = time.perf_counter()
+            inverse_reorder(SRAE * count + u'ក' + SRAAA * count)
+            elapsed.append(time.perf_counter() - start)
+        # linear time takes about 4 times longer, quadratic 16
+        self.assertLess(elapsed[1], 8 * elapsed[0] + 0.05)
+
+    def testLastBoundary(self):
+        self.assertEqual(last_boundary(u'កាប់គោ'), 4)
+        self.assertEqual(last_boundary(u'ក្រ'), 0)
+        self.assertEqual(last_boundary(u'ក្រ abc'), 6)
+        self.assertEqual(last_boundary(u''), 0)
+        self.assertEqual(last_boundary(u'កាប់គោ', 5), 0)
+        self.assertEqual(last_boundary(u'កាប់គោ', 4), 4)
+        text = u'កាប់គោ ខាងលើ ស្ត្រី'
+        for i in range(len(text)):
+            cut = last_boundary(text[:i])
+            self.assertEqual(reorder(text[:cut]) + reorder(text[cut:]), reorder(text))
+
 
 if __name__ == '__main__':
     unittest.main()
@@ -0,0 +1,215 @@
+"""
+Normalization of Khmer unicode text, cluster by cluster.
+The text is cut into extended clusters, a base and every mark following it, the coengs and zero width characters
+typed between them included, and every cluster is put in the order khmerStateTable expects:
+base, robat, coengs with coeng RO last, register shifter, one vowel, sign above, sign after.
+Duplicated vowels and signs are dropped, and so are coengs followed by a mark, SRAE typed with SRAAA or SRAII
+becomes SRAOO or SRAOE, the deprecated independent vowels U+17A3 and U+17A4 are replaced and the invisible inherent
+vowels U+17B4 and U+17B5 removed.
+"""
+import re
+import threading
+import unittest
+from .legacy_reorder import (
+    _charClasses, _xx, _rb, _cs, _sa, CF_CONSONANT, CC_DEPENDENT_VOWEL, CF_CLASS_MASK,
+    COENG, CORO, SRAE, SRAAA, SRAII, SRAOO, SRAOE, reorder,
+)
+
+
+ZERO_WIDTH = '\u200b\u200c\u200d'
+# removed from clusters, the invisible inherent vowels as well
+_invisible = ZERO_WIDTH + '\u17b4\u17b5'
+
+_consonants = ''.join(char for char, kChar in _charClasses.items() if kChar & CF_CONSONANT)
+_marks = ''.join(char for char, kChar in _charClasses.items() if not kChar & CF_CONSONANT)
+
+# a cluster with the zero width characters found inside it, or a run of characters outside of clusters
+_coeng = '%s[%s]*[%s]' % (COENG, _invisible, _consonants)
+_segments = re.compile('(?:%s|[%s%s])(?:[%s]*(?:%s|[%s]))*|[^%s%s]+' % (
+    _coeng, _consonants, _marks, _invisible, _coeng, _marks, _consonants, _marks))
+
+_replacements = str.maketrans({
+    '\u17a3': 'អ',
+    '\u17a4': 'អា',
+    '\u17b4': None,
+    '\u17b5': None,
+    '\u200b': None,
+    '\u200c': None,
+    '\u200d': None,
+})
+
+# split vowels typed as SRAE and their second part
+_composed = {SRAAA: SRAOO, SRAII: SRAOE}
+
+# rank of the parts of a cluster in canonical order
+_BASE = 0
+_ROBAT = 1
+_SHIFTER_BEFORE_COENG = 2
+_COENG = 3
+_CORO = 4
+_SHIFTER = 5
+_VOWEL = 6
+_SIGN_ABOVE = 7
+_SIGN_AFTER = 8
+# a coeng ending a cluster without a consonant, the following cluster starts with anything but a consonant
+_OPEN_COENG = 9
+
+# at most one of these in a cluster, a repeated one is dropped
+_single = (_ROBAT, _SHIFTER_BEFORE_COENG, _SHIFTER, _VOWEL, _SIGN_ABOVE, _SIGN_AFTER, _OPEN_COENG)
+
+_MAX_CACHED = 65536
+_local = threading.local()
+
+
+def normalize_cluster(cluster):
+    """ the canonical form of one extended cluster """
+    cluster = cluster.translate(_replacements)
+    charClasses = _charClasses
+    parts = []
+    coengs = False
+    count = len(cluster)
+    i = 0
+    while (i < count):
+        char = cluster[i]
+        kChar = charClasses.get(char, _xx)
+        if (char == COENG) and (i + 1 < count) and (charClasses.get(cluster[i + 1], _xx) & CF_CONSONANT):
+            text = cluster[i:i + 2]
+            parts.append((_CORO if text == CORO else _COENG, text))
+            coengs = True
+            i += 2
+            continue
+        if (kChar & CF_CONSONANT):
+            rank = _BASE
+        elif (char == COENG):
+            if (i + 1 < count):
+                # a coeng followed by a mark has nothing to combine with
+                i += 1
+                continue
+            rank = _OPEN_COENG
+        elif (kChar == _rb):
+            rank = _ROBAT
+        elif (kChar == _cs):
+            rank = _SHIFTER if coengs else _SHIFTER_BEFORE_COENG
+        elif ((kChar & CF_CLASS_MASK) == CC_DEPENDENT_VOWEL):
+            rank = _VOWEL
+        elif (kChar == _sa):
+            rank = _SIGN_ABOVE
+        else:                               # _sp
+            rank = _SIGN_AFTER
+        parts.append((rank, char))
+        i += 1
+
+    parts.sort(key=lambda part: part[0])
+    canonical = []
+    for part in parts:
+        if canonical and part == canonical[-1] and part[0] in _single:
+            continue
+        canonical.append(part)
+    vowels = [text for rank, text in canonical if rank == _VOWEL]
+    if len(vowels) == 2 and SRAE in vowels:
+        vowels.remove(SRAE)
+        composed = _composed.get(vowels[0])
+        if composed is not None:
+            first = next(i for i, (rank, text) in enumerate(canonical) if rank == _VOWEL)
+            canonical[first:first + 2] = [(_VOWEL, composed)]
+    return ''.join(text for rank, text in canonical)
+
+
+def _cache(key):
+    """ the cache of this thread for key """
+    try:
+        caches = _local.caches
+    except AttributeError:
+        caches = _local.caches = {}
+    cache = caches.get(key)
+    if cache is None:
+        cache = caches[key] = {}
+    return cache
+
+
+def normalize(text):
+    """ text with every cluster in canonical form """
+    cache = _cache(normalize_cluster)
+    charClasses = _charClasses
+    result = []
+    append = result.append
+    for match in _segments.finditer(text):
+        segment = match.group()
+        if segment[0] in charClasses:
+            canonical = cache.get(segment)
+            if canonical is None:
+                canonical = normalize_cluster(segment)
+                if len(cache) < _MAX_CACHED:
+                    cache[segment] = canonical
+            segment = canonical
+        append(segment)
+    return ''.join(result)
+
+
+def normalize_reorder(text, pre_reorder=None, alignment=None):
+    """
+    reorder(pre_reorder(normalize(text))) in a single pass over the clusters of text
+    the results are memoized per cluster, every cluster is a unit of alignment when one is given
+    """
+    cache = _cache(pre_reorder)
+    charClasses = _charClasses
+    result = []
+    append = result.append
+    written = 0
+    for match in _segments.finditer(text):
+        segment = match.group()
+        khmer = segment[0] in charClasses
+        if khmer:
+            reordered = cache.get(segment)
+            if reordered is None:
+                canonical = normalize_cluster(segment)
+                reordered = reorder(pre_reorder(canonical) if pre_reorder is not None else canonical)
+                if len(cache) < _MAX_CACHED:
+                    cache[segment] = reordered
+            segment = reordered
+        append(segment)
+        if alignment is not None:
+            written += len(segment)
+            if khmer:
+                alignment.add(match.end(), written)
+            else:
+                alignment.add_copy(match.end(), written)
+    return ''.join(result)
+
+
+class TestNormalization(unittest.TestCase):
+
+    def testNormalize(self):
+        # duplicated vowels and signs
+        self.assertEqual(normalize(u'កាា'), u'កា')
+        self.assertEqual(normalize(u'ខ្ញុុំំ'), u'ខ្ញុំ')
+        # zero width characters inside a cluster, those between words stay
+        self.assertEqual(normalize(u'ក\u200bា\u200cំ ខ\u200bគ'), u'កាំ ខ\u200bគ')
+        self.assertEqual(normalize(u'ក\u200b្\u200bរ'), u'ក្រ')
+        # coengs and vowels typed out of order
+        self.assertEqual(normalize(u'កា្រ'), u'ក្រា')
+        self.assertEqual(normalize(u'ស្រ្តី'), u'ស្ត្រី')
+        self.assertEqual(normalize(u'ប៊ី្ល'), u'ប៊្លី')
+        self.assertEqual(normalize(u'ន្សី៊'), u'ន្ស៊ី')
+        # a coeng followed by a mark is dropped, one ending the text stays
+        self.assertEqual(normalize(u'ក្ា ក្'), u'កា ក្')
+        # decomposed and deprecated forms
+        self.assertEqual(normalize(u'គេា កាេ លេី'), u'គោ កោ លើ')
+        self.assertEqual(normalize(u'\u17a3 \u17a4 ក\u17b4'), u'អ អា ក')
+        # canonical text is left as it is
+        text = u'ថ្ងៃខែឆ្នាំកំណើត ខ្ញុំ កញ្ច្រៀវ ស្ត្រី ប្រាំ, ប៉ៅ នុ៎ះ អ៊ុំ ម៉្ងៃ នំប៉័ង។ welcome'
+        self.assertEqual(normalize(text), text)
+        self.assertEqual(normalize(u''), u'')
+
+    def testNormalizeReorder(self):
+        from .alignment import Alignment
+        text = u'ថ្ងៃខែ កា្រ ស\u200bា ក្ក្ក ៗ welcome ា'
+        self.assertEqual(normalize_reorder(text), reorder(normalize(text)))
+        alignment = Alignment()
+        reordered = normalize_reorder(text, alignment=alignment)
+        self.assertEqual(alignment.to_target(0, len(text)), (0, len(reordered)))
+        self.assertEqual(alignment.to_source(*alignment.to_target(7, 8)), (7, 11))
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,92 @@
+import re
+
+
+def _build_trie(keys):
+    trie = {}
+    for key in keys:
+        node = trie
+        for char in key:
+            node = node.setdefault(char, {})
+        node[''] = True
+    return trie
+
+
+def _render(node):
+    """ render a trie node as a regular expression, longer alternatives first """
+    branches = []
+    singles = []
+    for char, child in node.items():
+        if char == '':
+            continue
+        if len(child) == 1 and '' in child:
+            singles.append(char)
+            continue
+        branch = re.escape(char) + '(?:' + _render(child) + ')'
+        if '' in child:
+            branch += '?'
+        branches.append(branch)
+    if singles:
+        if len(singles) == 1:
+            branches.append(re.escape(singles[0]))
+        else:
+            branches.append('[' + ''.join(_escape_class(char) for char in singles) + ']')
+    return '|'.join(branches)
+
+
+def _escape_class(char):
+    if char in '\\]^-[':
+        return '\\' + char
+    return char
+
+
+def compile_pattern(keys):
+    """ compile the keys of a mapping table into one regular expression matching the longest key first """
+    keys = [key for key in keys if key]
+    if not keys:
+        return re.compile(r'(?!)')
+    return re.compile(_render(_build_trie(keys)))
+
+
+class Translator:
+    """
+    Replaces every key of a mapping table found in a string in a single left to right pass.
+    At each position the longest matching key wins and replacement values are never matched again.
+    """
+
+    def __init__(self, table, pattern=None):
+        self.table = dict(table)
+        if pattern is None:
+            self.pattern = compile_pattern(self.table)
+        else:
+            self.pattern = re.compile(pattern)
+        lookup = self.table.__getitem__
+        self._replace = lambda match: lookup(match.group())
+
+    def translate(self, text, alignment=None):
+        """
+        translate a string, characters that are not in the table are copied through
+        the offsets of every replaced key and copied character are added to alignment when one is given
+        """
+        if alignment is None:
+            return self.pattern.sub(self._replace, text)
+        table = self.table
+        result = []
+        last = written = 0
+        for match in self.pattern.finditer(text):
+            start, end = match.span()
+            if start > last:
+                written += start - last
+                alignment.add_copy(start, written)
+                result.append(text[last:start])
+            value = table[match.group()]
+            written += len(value)
+            alignment.add(end, written)
+            result.append(value)
+            last = end
+        if last < len(text):
+            alignment.add_copy(len(text), written + len(text) - last)
+            result.append(text[last:])
+        return ''.join(result)
+
+    def __call__(self, text):
+        return self.translate(text)
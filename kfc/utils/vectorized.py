@@ -0,0 +1,177 @@
+"""
+numpy implementation of legacy_reorder.reorder.
+The text is viewed as an array of code points, classified with one table lookup and cut into clusters at the
+characters that always start one. Every cluster is reduced to a shape, the sequence of the classes of its
+characters, and the shapes are turned into templates by running the state machine of legacy_reorder once on a
+sample of each. The output is then gathered from the input and the template literals with array operations.
+"""
+import threading
+import numpy as np
+from . import legacy_reorder
+from .legacy_reorder import (
+    _charClasses, CF_CONSONANT,
+    LA, NYO, BA, YO, SA, SRAE, SRAAA, SRAAU, COENG, TRIISAP, MUUSIKATOAN, SAMYOKSANNYA, sraEcombining,
+)
+
+
+# below this length the pure python state machine is faster
+MIN_CHARS = 2048
+
+# the state machine compares these characters by value or writes them itself, they get a code of their own
+_SPECIAL = set((LA, NYO, BA, YO, SA, chr(0x179A), SRAE, SRAAA, SRAAU, COENG, TRIISAP, MUUSIKATOAN, SAMYOKSANNYA))
+_SPECIAL.update(sraEcombining)
+_SPECIAL.update(sraEcombining.values())
+
+_BITS = 6
+# longest cluster with a shape, longer ones go through the state machine
+_MAX_SHAPE = 9
+_SCALAR = -1
+
+
+def _build_codes():
+    """ code of every character, characters of a generic code are only ever moved by the state machine """
+    keys = {None: 0}
+    members = {0: [u' ']}
+    generic = {0}
+    codes = np.zeros(0x1800, dtype=np.int64)
+    for char, kChar in sorted(_charClasses.items()):
+        key = char if char in _SPECIAL else kChar
+        if key not in keys:
+            keys[key] = len(keys)
+            if char not in _SPECIAL:
+                generic.add(keys[key])
+        codes[ord(char)] = keys[key]
+        members.setdefault(keys[key], []).append(char)
+    assert len(keys) < 1 << _BITS
+    return codes, members, generic
+
+
+_codes, _members, _generic = _build_codes()
+_consonants = np.zeros(0x1800, dtype=bool)
+_consonants[[ord(char) for char, kChar in _charClasses.items() if kChar & CF_CONSONANT]] = True
+
+_lock = threading.Lock()
+# sorted signatures of the shapes seen so far and their template numbers
+_signatures = np.zeros(0, dtype=np.int64)
+_numbers = np.zeros(0, dtype=np.int64)
+# template rows: offsets into the cluster, or -1 - n for the n-th literal
+_templates = []
+_lengths = np.zeros(0, dtype=np.int64)
+_items = np.zeros((0, 1), dtype=np.int64)
+_literals = []
+
+
+def _template(signature):
+    """ the template of a shape, None if the state machine has to see the actual characters """
+    length = signature >> (_BITS * _MAX_SHAPE)
+    used = {}
+    sample = []
+    for offset in range(length):
+        code = (signature >> (_BITS * offset)) & ((1 << _BITS) - 1)
+        index = used.get(code, 0)
+        if code in _generic:
+            if index >= len(_members[code]):
+                return None
+            used[code] = index + 1
+        sample.append(_members[code][index])
+    sample = ''.join(sample)
+    template = []
+    for char in legacy_reorder.reorder(sample):
+        offset = sample.find(char)
+        if offset < 0:
+            if char not in _literals:
+                _literals.append(char)
+            template.append(-1 - _literals.index(char))
+        else:
+            template.append(offset)
+    return template
+
+
+def _learn(signatures):
+    """ add the templates of new shapes """
+    global _signatures, _numbers, _lengths, _items
+    with _lock:
+        new = signatures[~np.isin(signatures, _signatures)]
+        if not len(new):
+            return
+        numbers = []
+        for signature in new.tolist():
+            template = _template(signature)
+            if template is None:
+                numbers.append(_SCALAR)
+            else:
+                numbers.append(len(_templates))
+                _templates.append(template)
+        width = max(1, max(len(template) for template in _templates) if _templates else 1)
+        items = np.zeros((len(_templates), width), dtype=np.int64)
+        for row, template in enumerate(_templates):
+            items[row, :len(template)] = template
+        signatures = np.concatenate((_signatures, new))
+        order = np.argsort(signatures)
+        _numbers = np.concatenate((_numbers, numbers))[order]
+        _signatures = signatures[order]
+        _lengths = np.array([len(template) for template in _templates], dtype=np.int64)
+        _items = items
+
+
+def reorder(sin):
+    """ same as legacy_reorder.reorder """
+    if len(sin) < MIN_CHARS:
+        return legacy_reorder.reorder(sin)
+    points = np.frombuffer(sin.encode('utf-32-le'), dtype=np.uint32).astype(np.int64)
+    count = len(points)
+    codes = np.where(points < 0x1800, _codes[np.minimum(points, 0x17FF)], 0)
+
+    # a cluster starts at every character outside of clusters and at every consonant not following a coeng
+    starts = codes == 0
+    starts |= (points < 0x1800) & _consonants[np.minimum(points, 0x17FF)]
+    starts[1:] &= points[:-1] != ord(COENG)
+    starts[0] = True
+    first = np.flatnonzero(starts)
+    lengths = np.diff(np.append(first, count))
+
+    signatures = np.minimum(lengths, _MAX_SHAPE + 1) << (_BITS * _MAX_SHAPE)
+    for offset in range(_MAX_SHAPE):
+        at = np.minimum(first + offset, count - 1)
+        signatures |= np.where(lengths > offset, codes[at], 0) << (_BITS * offset)
+    shaped = lengths <= _MAX_SHAPE
+    unique = np.unique(signatures[shaped])
+    if len(unique) and not np.isin(unique, _signatures).all():
+        _learn(unique)
+    with _lock:
+        signatures_, numbers, items, template_lengths, literals = \
+            _signatures, _numbers, _items, _lengths, tuple(_literals)
+    if not len(_templates):
+        return legacy_reorder.reorder(sin)
+
+    found = np.minimum(np.searchsorted(signatures_, signatures), len(signatures_) - 1)
+    number = np.where(shaped, numbers[found], _SCALAR)
+    known = number != _SCALAR
+    if not known.any():
+        return legacy_reorder.reorder(sin)
+
+    # clusters the templates do not cover are reordered by the state machine, a run of them at a time
+    extra = []
+    base = first.copy()
+    out_lengths = np.where(known, template_lengths[np.maximum(number, 0)], 0)
+    if not known.all():
+        position = count + len(literals)
+        runs = np.flatnonzero(np.diff(np.concatenate(([1], known.view(np.int8), [1]))))
+        for start, end in zip(runs[::2].tolist(), runs[1::2].tolist()):
+            stop = first[end] if end < len(first) else count
+            reordered = legacy_reorder.reorder(sin[first[start]:stop])
+            extra.append(reordered)
+            base[start] = position
+            out_lengths[start] = len(reordered)
+            position += len(reordered)
+
+    total = int(out_lengths.sum())
+    cluster = np.repeat(np.arange(len(first)), out_lengths)
+    offsets = np.arange(total) - np.repeat(np.cumsum(out_lengths) - out_lengths, out_lengths)
+    item = np.where(known[cluster], items[np.maximum(number[cluster], 0), np.minimum(offsets, items.shape[1] - 1)],
+                    offsets)
+    gather = np.where(item >= 0, base[cluster] + item, count - 1 - item)
+    table = np.concatenate((points, np.array([ord(char) for char in literals], dtype=np.int64),
+                            np.frombuffer(''.join(extra).encode('utf-32-le'), dtype=np.uint32).astype(np.int64)))
+    return table[gather].astype(np.uint32).tobytes().decode('utf-32-le')
+
@@ -1,7 +1,8 @@
-from distutils.core import setup
+from setuptools import setup
 setup(
     name='kfc',
-    packages=['kfc', 'kfc/utils'],
+    packages=['kfc', 'kfc/utils', 'kfc/fonts'],
+    package_data={'kfc': ['fonts/*.json']},
     version='0.2.2',
     license='GNU General Public License v3.0 or later (GPL-3.0-or-later)',
     description='A library to convert khmer unicode text to limon format and vice versa',
@@ -11,6 +12,10 @@ setup(
     download_url='https://github.com/user/reponame/archive/v_01.tar.gz',
     keywords=['KHMER', 'UNICODE', 'LIMON', 'CONVERTER'],
     install_requires=[],
+    extras_require={'numpy': ['numpy'], 'pandas': ['pandas'], 'arrow': ['pyarrow']},
+    entry_points={
+        'console_scripts': ['kfc=kfc.cli:main'],
+    },
     classifiers=[
         'Development Status :: 4 - Beta',
         'Intended Audience :: Developers',